@@ -0,0 +1,71 @@
+"""
+Compares long_short_weights (np.argpartition) with the quantile cutoffs and the
+list comprehension that were previously used in create_portfolio of the ratio strategies
+
+python benchmarks/bench_decision_rules.py --tickers 1000 5000 20000
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.strategies.decision_rules import long_short_weights, to_portfolio
+
+
+QUANTILES = {'median' : .5, 'quartile' : .75, 'octile' : .875}
+
+
+def decision_rule_loop(preds, tickers, decision_rule):
+    preds = pd.DataFrame(preds, index=tickers, columns=['prediction'])
+    upper_cutoff = np.quantile(preds, QUANTILES[decision_rule])
+    lower_cutoff = np.quantile(preds, 1 - QUANTILES[decision_rule])
+
+    preds['prediction'] = [1 if x>upper_cutoff else -1 if x<lower_cutoff else 0 for x in preds['prediction']]
+
+    number_long = preds[preds['prediction'] == 1]['prediction'].shape[0]
+    number_short = preds[preds['prediction'] == -1]['prediction'].shape[0]
+
+    preds.loc[preds['prediction'] == 1, 'prediction'] = 1 / number_long
+    preds.loc[preds['prediction'] == -1, 'prediction'] = -1 / number_short
+
+    return preds.to_dict()['prediction']
+
+
+def decision_rule_vector(preds, tickers, decision_rule):
+    return to_portfolio(tickers, long_short_weights(preds, decision_rule))
+
+
+def timeit(function, repeats, *args):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickers', default=[1000, 5000, 20000], nargs='+', type=int)
+    parser.add_argument('--repeats', default=5, type=int)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f'{"tickers":>8} | {"rule":>8} | {"loop, ms":>8} | {"vector, ms":>10} | {"speedup":>7}')
+    for number_tickers in args.tickers:
+        preds = rng.normal(size=(number_tickers, 1))
+        tickers = np.array([f'sh{600000 + i}' for i in range(number_tickers)], dtype=object)
+        for decision_rule in QUANTILES.keys():
+            time_loop, expected = timeit(decision_rule_loop, args.repeats, preds, tickers, decision_rule)
+            time_vector, result = timeit(decision_rule_vector, args.repeats, preds, tickers, decision_rule)
+
+            assert np.allclose(list(expected.values()), list(result.values())), \
+                'Warning, argpartition weights differ from the loop!'
+
+            print(f'{number_tickers:>8} | {decision_rule:>8} | {time_loop * 1e3:>8.2f} | '
+                  f'{time_vector * 1e3:>10.2f} | {time_loop / time_vector:>6.1f}x')
@@ -0,0 +1,69 @@
+"""
+Compares the training time of NNRatiosModel with the Lightning trainer and
+with the lean engine (plain torch loop) on the same synthetic data, and the
+training of ensemble_size models one by one with the training of the batched ensemble
+
+python benchmarks/bench_nn_training.py --rows 20000 100000 --num_threads 4 --ensemble_size 8
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.strategies.cfg import NNCFG
+from src.strategies.nn_ratios import NNRatios
+
+
+def make_train_data(number_rows, number_columns, seed=0):
+    rng = np.random.default_rng(seed)
+    train_x = pd.DataFrame(rng.normal(size=(number_rows, number_columns)))
+    train_y = pd.Series(train_x.to_numpy() @ rng.normal(size=number_columns) * .01
+                        + rng.normal(scale=.05, size=number_rows))
+    return train_x, train_y
+
+
+def time_fit(train_x, train_y, **params):
+    for name, value in params.items():
+        setattr(NNCFG, name, value)
+    strategy = NNRatios()
+    start = time.perf_counter()
+    strategy._fit(train_x, train_y)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', default=[20000, 100000], nargs='+', type=int)
+    parser.add_argument('--num_threads', default=None, type=int)
+    parser.add_argument('--ensemble_size', default=8, type=int)
+    args = parser.parse_args()
+
+    NNCFG.type_model = 'regression'
+    NNCFG.num_threads = args.num_threads
+    # Lightning writes logs and checkpoints to the working directory
+    os.chdir(tempfile.mkdtemp())
+
+    engines = [('lightning', dict(engine='lightning', ensemble_size=1)),
+               (f'lean, batch {NNCFG.batch_size}',
+                dict(engine='lean', lean_batch_size=NNCFG.batch_size, ensemble_size=1)),
+               ('lean, batch 4096', dict(engine='lean', lean_batch_size=4096, ensemble_size=1)),
+               ('lean, full batch', dict(engine='lean', lean_batch_size=None, ensemble_size=1))]
+
+    print(f'{"rows":>8} | {"engine":<24} | {"fit, s":>7}')
+    for number_rows in args.rows:
+        train_x, train_y = make_train_data(number_rows, 11)
+        for name, params in engines:
+            print(f'{number_rows:>8} | {name:<24} | {time_fit(train_x, train_y, **params):>7.3f}')
+
+        # Same number of models, trained one by one or as one batched ensemble
+        single = dict(engine='lean', lean_batch_size=NNCFG.batch_size, ensemble_size=1)
+        one_by_one = sum(time_fit(train_x, train_y, **single) for _ in range(args.ensemble_size))
+        print(f'{number_rows:>8} | {f"lean, {args.ensemble_size} models":<24} | {one_by_one:>7.3f}')
+        ensemble = time_fit(train_x, train_y, **dict(single, ensemble_size=args.ensemble_size))
+        print(f'{number_rows:>8} | {f"lean, ensemble of {args.ensemble_size}":<24} | {ensemble:>7.3f}')
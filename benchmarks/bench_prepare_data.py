@@ -0,0 +1,78 @@
+"""
+Compares the vectorized prepare_returns with the per ticker loop that was
+previously used in _prepare_data of the ratio strategies
+
+python benchmarks/bench_prepare_data.py --tickers 1000 2000 4000
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.strategies.features import prepare_returns
+
+
+COLUMNS_X = ['outstanding_share', 'turnover', 'pe', 'pe_ttm', 'pb',
+             'ps', 'ps_ttm', 'dv_ratio', 'dv_ttm', 'total_mv', 'qfq_factor']
+
+
+def make_strategy_data(number_tickers, number_dates, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2020-01-01', periods=number_dates).strftime('%Y-%m-%d')
+    data = pd.DataFrame({'ticker' : np.repeat([f'sh{600000 + i}' for i in range(number_tickers)], number_dates),
+                         'date' : np.tile(dates, number_tickers)})
+    data['price'] = rng.lognormal(2, .5, len(data)).astype(np.float32)
+    for column in COLUMNS_X:
+        values = rng.normal(1, .3, len(data)).astype(np.float32)
+        values[rng.random(len(data)) < .02] = np.nan
+        data[column] = values
+    # Keep about 95% of rows, as some stocks are not traded on some dates
+    data = data[rng.random(len(data)) < .95]
+    return data.sort_values(by=['date', 'ticker']).reset_index(drop=True)
+
+
+def prepare_returns_loop(strategy_data):
+    new_df = pd.DataFrame(columns=strategy_data.columns)
+    for ticker in strategy_data['ticker'].unique():
+        current_df = strategy_data[strategy_data['ticker'] == ticker]
+        current_df = current_df.sort_values(by=['date'])
+        current_df['next_price'] = current_df['price'].diff().shift(-1)
+        current_df['return'] = current_df.apply(lambda x: x['next_price'] / x['price'] - 1, axis=1)
+        current_df = current_df.dropna()
+        new_df = pd.concat([new_df, current_df])
+    return new_df
+
+
+def timeit(function, data, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(data)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickers', default=[1000, 2000, 4000], nargs='+', type=int)
+    parser.add_argument('--dates', default=6, type=int)
+    parser.add_argument('--repeats', default=3, type=int)
+    args = parser.parse_args()
+
+    print(f'{"tickers":>8} | {"rows":>8} | {"loop, s":>8} | {"vector, s":>9} | {"speedup":>7}')
+    for number_tickers in args.tickers:
+        data = make_strategy_data(number_tickers, args.dates)
+        time_loop, expected = timeit(prepare_returns_loop, data, 1)
+        time_vector, result = timeit(prepare_returns, data, args.repeats)
+
+        expected = expected.sort_values(by=['ticker', 'date'])
+        assert np.allclose(expected['return'].to_numpy(np.float64), result['return'].to_numpy(), rtol=1e-5), \
+            'Warning, vectorized returns differ from the loop!'
+
+        print(f'{number_tickers:>8} | {len(data):>8} | {time_loop:>8.3f} | {time_vector:>9.4f} | '
+              f'{time_loop / time_vector:>6.0f}x')
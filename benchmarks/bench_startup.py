@@ -0,0 +1,70 @@
+"""
+Measures the cold start latency of the CLI for every strategy
+
+For each strategy a fresh interpreter imports trade.py and resolves the strategy
+with python -X importtime, the report shows the total import time and
+the slowest top level imports
+
+python benchmarks/bench_startup.py --top 5
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.strategies.registry import STRATEGIES
+
+
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+
+def measure_startup(strategy):
+    """
+    Returns the wall time of the interpreter and the list of
+    top level imports as (module, cumulative time in seconds)
+    """
+    code = ('import trade; from src.strategies.registry import get_strategy_class; '
+            f'get_strategy_class("{strategy}")')
+
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    wall_time = time.perf_counter() - start
+
+    imports = []
+    for line in output.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        # Only the top level imports, nested imports are included in their cumulative time
+        if match is not None and match.group(3) == '':
+            imports.append((match.group(4), int(match.group(2)) / 1e6))
+
+    return wall_time, sorted(imports, key=lambda x: -x[1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--strategies', default=STRATEGIES, nargs='+', type=str)
+    parser.add_argument('--top', default=5, type=int, help='Number of slowest imports to show')
+    parser.add_argument('--output', default=None, type=str, help='Save the report to a json file')
+    args = parser.parse_args()
+
+    report = {}
+    for strategy in args.strategies:
+        wall_time, imports = measure_startup(strategy)
+        import_time = sum(x[1] for x in imports)
+        report[strategy] = {'wall_time' : wall_time, 'import_time' : import_time,
+                            'top_imports' : imports[:args.top]}
+
+        print(f'{strategy} | wall time: {wall_time:.2f}s | import time: {import_time:.2f}s')
+        for module, cumulative in imports[:args.top]:
+            print(f'    {module:<40} {cumulative:.3f}s')
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
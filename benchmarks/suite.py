@@ -0,0 +1,209 @@
+"""
+Benchmark suite on synthetic data (see benchmarks/synthetic_data.py)
+
+For every scale the data is generated once into data_root/{scale}, then every
+benchmark is run repeats times and the minimum and the median times are kept.
+The results are saved to benchmarks/results/{commit}.json, so that the runs
+of different commits can be compared
+
+python benchmarks/suite.py --scales small medium
+python benchmarks/suite.py --scales small --filter simulate strategy
+python benchmarks/suite.py --compare 1a2b3c4      (compares with the saved results of the commit)
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from importlib.util import find_spec
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic_data import generate
+from src.datamodule import DataModule
+from src.portfolio import Portfolio, ArrayPortfolio
+from src.simulator import Simulator
+from src.metrics import compute_metrics, bootstrap_ci, period_returns, sharpe_ratio
+from src.strategies.registry import build_strategy
+
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+# scale : (tickers, dates)
+SCALES = {'small' : (100, 500), 'medium' : (500, 1000), 'large' : (2000, 2500)}
+
+
+def get_commit():
+    """
+    Returns the short hash of HEAD, marked as dirty if the tree has changes
+    """
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+
+    commit = git('rev-parse', '--short', 'HEAD') or 'unknown'
+    if git('status', '--porcelain', '--untracked-files=no'):
+        commit += '-dirty'
+    return commit
+
+
+def timeit(function, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'min' : min(times), 'median' : float(np.median(times)), 'repeats' : repeats}
+
+
+def prepare_data(data_root, scale):
+    data_dir = os.path.join(data_root, scale)
+    if not os.path.exists(os.path.join(data_dir, 'stock_data.csv')):
+        number_tickers, number_dates = SCALES[scale]
+        print(f'...Generating {scale} data ({number_tickers} tickers x {number_dates} dates)...')
+        generate(data_dir, number_tickers, number_dates)
+    return data_dir
+
+
+def get_benchmarks(data_dir, dm):
+    """
+    Returns the dictionary {name : function} of the benchmarks on the loaded datamodule dm
+    """
+    dates = dm.get_schedule('monthly', dm.panel.dates[0], dm.panel.dates[-1])
+    date, previous_date = dates[len(dates) // 2], dates[len(dates) // 2 - 1]
+    tickers = dm.get_tickers(date)
+    ticker = tickers[0]
+
+    benchmarks = {
+        'datamodule.load_csv' : lambda: DataModule(data_dir, use_cache=False),
+        'datamodule.load_cache' : lambda: DataModule(data_dir),
+        'datamodule.get_schedule' : lambda: (dm._schedules.clear(),
+                                             dm.get_schedule('weekly', dm.panel.dates[0], dm.panel.dates[-1])),
+        'datamodule.get_tickers' : lambda: dm.get_tickers(date),
+        'datamodule.get_date_block' : lambda: dm.get_date_block(date),
+        'datamodule.get_trailing_data' : lambda: dm._get_trailing_data(dates, 6, date),
+        'datamodule.get_diff_and_current_prices' : lambda: dm.get_diff_and_current_prices(tickers,
+                                                                                         previous_date, date),
+        'datamodule.get_price_vectors' : lambda: dm.get_price_vectors(previous_date, date),
+        'datamodule.get_feature' : lambda: dm.get_feature(ticker, 'pe'),
+        'datamodule.get_feature_store' : lambda: (dm._feature_stores.clear(), dm.get_feature_store(dates)),
+    }
+
+    # Portfolios after the allocation of an equally weighted long short portfolio,
+    # as in the simulator the positions are traded at both dates
+    traded_tickers = np.intersect1d(tickers.astype(str), dm.get_tickers(previous_date).astype(str))
+    weights = {t : (1 if idx % 2 == 0 else -1) / len(traded_tickers) * 2 for idx, t in enumerate(traded_tickers)}
+    diff_prices, start_prices = dm.get_diff_and_current_prices(tickers, previous_date, date)
+    diff_vector, start_vector = dm.get_price_vectors(previous_date, date)
+    portfolio = Portfolio()
+    portfolio.allocate_positions(weights)
+    array_portfolio = ArrayPortfolio(dm.panel.tickers)
+    array_portfolio.allocate_positions(weights)
+    benchmarks['portfolio.allocate_positions'] = lambda: portfolio.allocate_positions(weights)
+    benchmarks['array_portfolio.allocate_positions'] = lambda: array_portfolio.allocate_positions(weights)
+    benchmarks['portfolio.update_portfolio'] = lambda: portfolio.update_portfolio(diff_prices, start_prices)
+    benchmarks['array_portfolio.update_portfolio'] = lambda: array_portfolio.update_portfolio(diff_vector,
+                                                                                             start_vector)
+
+    strategies = ['OLSRatios', 'LogitRatios']
+    # NNRatios is benchmarked only if torch is installed
+    if find_spec('torch') is not None:
+        strategies.append('NNRatios')
+    for name in strategies:
+        params = {'engine' : 'lean'} if name == 'NNRatios' else {}
+        strategy = build_strategy(name, 'quartile', **params)
+        strategy_data = dm._get_trailing_data(dates, strategy.required_number_dates, date)
+
+        def create_portfolio(strategy=strategy, strategy_data=strategy_data):
+            # Every call trains the model and creates the portfolio
+            strategy.last_training_date = None
+            strategy.create_portfolio(strategy_data, tickers)
+
+        benchmarks[f'strategy.{name}._prepare_data'] = \
+            lambda strategy=strategy, strategy_data=strategy_data: strategy._prepare_data(strategy_data)
+        benchmarks[f'strategy.{name}.create_portfolio'] = create_portfolio
+
+    for frequency in ['monthly', 'weekly']:
+        benchmarks[f'simulate.OLSRatios.{frequency}'] = lambda frequency=frequency: Simulator(
+            dm, Portfolio(), build_strategy('OLSRatios', 'quartile'), frequency,
+            dm.panel.dates[0], dm.panel.dates[-1]).simulate(verbose=False, progress_bar=False)
+    benchmarks['simulate_prefetched.OLSRatios.weekly'] = lambda: Simulator(
+        dm, Portfolio(), build_strategy('OLSRatios', 'quartile'), 'weekly',
+        dm.panel.dates[0], dm.panel.dates[-1]).simulate(verbose=False, progress_bar=False, prefetch=2)
+    benchmarks['simulate_vectorized.OLSRatios.weekly'] = lambda: Simulator(
+        dm, Portfolio(), build_strategy('OLSRatios', 'quartile'), 'weekly',
+        dm.panel.dates[0], dm.panel.dates[-1]).simulate_vectorized(verbose=False, progress_bar=False)
+
+    # Scoring of the curves of a large sweep
+    curves = 100 * np.cumprod(1 + np.random.default_rng(0).normal(0, .02, (1000, len(dates))), axis=1)
+    benchmarks['metrics.compute_metrics.1000_curves'] = lambda: compute_metrics(curves, 'monthly', .01)
+    benchmarks['metrics.bootstrap_ci.100_curves'] = lambda: bootstrap_ci(period_returns(curves[:100]), sharpe_ratio,
+                                                                         number_samples=1000, frequency='monthly')
+
+    return benchmarks
+
+
+def run_suite(scales, data_root, repeats, filters=None):
+    results = {}
+    for scale in scales:
+        data_dir = prepare_data(data_root, scale)
+        dm = DataModule(data_dir)
+        results[scale] = {}
+        for name, function in get_benchmarks(data_dir, dm).items():
+            if filters and not any(f in name for f in filters):
+                continue
+            # The load from csv and the simulations are slow, they are run once
+            number_repeats = 1 if name.startswith(('datamodule.load_csv', 'simulate')) else repeats
+            results[scale][name] = timeit(function, number_repeats)
+            print(f'{scale:>7} | {name:<45} | {results[scale][name]["min"] * 1e3:>10.3f} ms')
+    return results
+
+
+def save_results(results, commit):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    file_path = os.path.join(RESULTS_DIR, f'{commit}.json')
+    with open(file_path, 'w') as f:
+        json.dump({'commit' : commit, 'created_at' : time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'python' : platform.python_version(), 'machine' : platform.platform(),
+                   'results' : results}, f, indent=1)
+    print(f'Results are saved to {file_path}')
+
+
+def compare(results, baseline_commit):
+    """
+    Prints the ratio of the times of the current run to the times of the baseline commit
+    """
+    with open(os.path.join(RESULTS_DIR, f'{baseline_commit}.json')) as f:
+        baseline = json.load(f)['results']
+
+    print(f'{"scale":>7} | {"benchmark":<45} | {baseline_commit:>10} | {"current":>10} | {"ratio":>6}')
+    for scale, scale_results in results.items():
+        for name, result in scale_results.items():
+            if name not in baseline.get(scale, {}):
+                continue
+            before = baseline[scale][name]['min']
+            print(f'{scale:>7} | {name:<45} | {before * 1e3:>8.2f}ms | {result["min"] * 1e3:>8.2f}ms | '
+                  f'{result["min"] / before:>5.2f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', default=['small'], nargs='+', choices=list(SCALES.keys()))
+    parser.add_argument('--data_root', default=os.path.join(ROOT, 'benchmarks', 'data'), type=str,
+                        help='Directory of the generated data')
+    parser.add_argument('--repeats', default=5, type=int)
+    parser.add_argument('--filter', default=None, nargs='+', type=str,
+                        help='Run only the benchmarks containing one of the strings')
+    parser.add_argument('--compare', default=None, type=str, help='Commit of the saved results to compare with')
+    parser.add_argument('--no_save', action='store_true')
+    args = parser.parse_args()
+
+    results = run_suite(args.scales, args.data_root, args.repeats, args.filter)
+    if not args.no_save:
+        save_results(results, get_commit())
+    if args.compare is not None:
+        compare(results, args.compare)
@@ -0,0 +1,94 @@
+"""
+Writes a synthetic market in the format of the Kaggle dataset
+(stock_data.csv and ticker_info.csv), so that the code can be run and
+benchmarked without the download
+
+Prices follow geometric random walks and the ratios are noisy functions of
+the ticker and the price. Missing data is similar to the real dataset:
+tickers are listed and delisted during the period, trading is suspended
+for runs of days and some values of the ratios are missing
+
+python benchmarks/synthetic_data.py --data_dir data --tickers 500 --dates 1000
+"""
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+
+RATIO_COLUMNS = ['outstanding_share', 'turnover', 'pe', 'pe_ttm', 'pb',
+                 'ps', 'ps_ttm', 'dv_ratio', 'dv_ttm', 'total_mv', 'qfq_factor']
+
+
+def generate(data_dir, number_tickers=500, number_dates=1000, start_date='2015-01-05',
+             listing_rate=.2, suspension_rate=.01, suspension_days=10, missing_rate=.03, seed=0):
+    """
+    Writes data_dir/stock_data.csv and data_dir/ticker_info.csv, returns the number of rows
+
+    number_dates : number of business days from start_date
+    listing_rate : share of tickers which are listed or delisted during the period
+    suspension_rate : probability of a ticker to be suspended on a date,
+    a suspension lasts for 1 to suspension_days dates
+    missing_rate : share of missing values of every ratio column
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start_date, periods=number_dates).strftime('%Y-%m-%d').to_numpy()
+    tickers = np.array([f'sh{600000 + i}' for i in range(number_tickers)])
+
+    # (dates x tickers) mask of the traded rows
+    first_date = np.where(rng.random(number_tickers) < listing_rate / 2,
+                          rng.integers(0, number_dates, number_tickers), 0)
+    last_date = np.where(rng.random(number_tickers) < listing_rate / 2,
+                         rng.integers(0, number_dates, number_tickers), number_dates)
+    positions = np.arange(number_dates)[:, None]
+    traded = (positions >= first_date) & (positions < np.maximum(last_date, first_date + 1))
+
+    suspended = np.zeros((number_dates, number_tickers), dtype=bool)
+    suspension_starts = np.argwhere(rng.random((number_dates, number_tickers)) < suspension_rate)
+    for (date_position, ticker_position), length in zip(suspension_starts,
+                                                        rng.integers(1, suspension_days + 1, len(suspension_starts))):
+        suspended[date_position:date_position + length, ticker_position] = True
+    traded &= ~suspended
+
+    log_returns = rng.normal(0, .02, (number_dates, number_tickers))
+    prices = 10 * np.exp(rng.normal(0, .5, number_tickers) + np.cumsum(log_returns, axis=0))
+
+    date_index, ticker_index = np.nonzero(traded)
+    close = prices[date_index, ticker_index]
+    open_ = close * np.exp(rng.normal(0, .005, len(close)))
+    data = {'ticker' : tickers[ticker_index], 'date' : dates[date_index],
+            'open' : open_, 'high' : np.maximum(open_, close) * (1 + rng.random(len(close)) * .02),
+            'low' : np.minimum(open_, close) * (1 - rng.random(len(close)) * .02), 'close' : close,
+            'volume' : rng.lognormal(13, 1, len(close)).round()}
+
+    ticker_effects = rng.normal(0, .3, (number_tickers, len(RATIO_COLUMNS)))
+    for idx, column in enumerate(RATIO_COLUMNS):
+        values = 1 + ticker_effects[ticker_index, idx] + .1 * np.log(close) + rng.normal(0, .3, len(close))
+        values[rng.random(len(close)) < missing_rate] = np.nan
+        data[column] = values
+
+    os.makedirs(data_dir, exist_ok=True)
+    # The Kaggle file is sorted by ticker and then by date
+    stock_data = pd.DataFrame(data).sort_values(by=['ticker', 'date'], kind='mergesort')
+    stock_data.to_csv(os.path.join(data_dir, 'stock_data.csv'), index=False)
+
+    pd.DataFrame({'ticker' : tickers, 'name' : tickers}).to_csv(
+        os.path.join(data_dir, 'ticker_info.csv'), index=False)
+
+    return len(stock_data)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data_dir', default='data', type=str)
+    parser.add_argument('--tickers', default=500, type=int)
+    parser.add_argument('--dates', default=1000, type=int)
+    parser.add_argument('--start_date', default='2015-01-05', type=str)
+    parser.add_argument('--missing_rate', default=.03, type=float)
+    parser.add_argument('--seed', default=0, type=int)
+    args = parser.parse_args()
+
+    number_rows = generate(args.data_dir, args.tickers, args.dates, args.start_date,
+                           missing_rate=args.missing_rate, seed=args.seed)
+    print(f'{number_rows} rows are written to {args.data_dir}')
@@ -1,21 +1,6 @@
 #!/bin/sh
 
-# OLS strategy
-python trade.py -s OLSRatios -f monthly -d median -start 2020-07-01 --save_history
-python trade.py -s OLSRatios -f monthly -d quartile -start 2020-07-01 --save_history
-python trade.py -s OLSRatios -f monthly -d octile -start 2020-07-01 --save_history
-
-# Logit method
-python trade.py -s LogitRatios -f monthly -d median -start 2020-07-01 --save_history
-python trade.py -s LogitRatios -f monthly -d quartile -start 2020-07-01 --save_history
-python trade.py -s LogitRatios -f monthly -d octile -start 2020-07-01 --save_history
-
-# NNReg method
-python trade.py -s NNRatios -f monthly -d median -t regression -start 2020-07-01 --save_history
-python trade.py -s NNRatios -f monthly -d quartile -t regression -start 2020-07-01 --save_history
-python trade.py -s NNRatios -f monthly -d octile -t regression -start 2020-07-01 --save_history
-
-# NNClass method
-python trade.py -s NNRatios -f monthly -d median -t classification -start 2020-07-01 --save_history
-python trade.py -s NNRatios -f monthly -d quartile -t classification -start 2020-07-01 --save_history
-python trade.py -s NNRatios -f monthly -d octile -t classification -start 2020-07-01 --save_history
+# OLS, Logit, NNReg and NNClass methods with median, quartile and octile
+# decision rules, all twelve runs are executed in parallel (one per cpu by default)
+python -m src.sweep -s OLSRatios LogitRatios NNRatios -d median quartile octile \
+    -t regression classification -f monthly -r 2020-07-01:2022-05-11 --save_history
@@ -0,0 +1,182 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from datetime import date
+
+
+class DataCache():
+    """
+    DataCache keeps a columnar binary copy of data/stock_data.csv so that
+    the csv is parsed only once, not on every run of trade.py
+
+    Every column is saved as a separate .npy file inside cache_dir and is
+    loaded back memory-mapped with compact dtypes:
+    ticker : int32 codes into tickers.npy (loaded as a categorical column)
+    date_ordinal : int32 proleptic Gregorian ordinals of the dates
+    everything else : float32, including the derived price column
+
+    The rows are stored sorted by date and then by ticker, so that all rows
+    of a single date are contiguous.
+
+    The cache is rebuilt automatically whenever the modification time or the
+    size of one of the source csv files changes.
+    """
+    version = 1
+
+    def __init__(self, data_dir='data', cache_dir=None):
+        self.data_dir = data_dir
+        self.cache_dir = cache_dir if cache_dir is not None else os.path.join(data_dir, 'cache')
+        self.stock_file = os.path.join(data_dir, 'stock_data.csv')
+        self.ticker_file = os.path.join(data_dir, 'ticker_info.csv')
+        self.meta_file = os.path.join(self.cache_dir, 'meta.json')
+
+    def _fingerprint(self):
+        fingerprint = {'version' : self.version}
+        for file_path in [self.stock_file, self.ticker_file]:
+            stat = os.stat(file_path)
+            fingerprint[os.path.basename(file_path)] = [stat.st_mtime_ns, stat.st_size]
+        return fingerprint
+
+    def _read_meta(self):
+        if not os.path.exists(self.meta_file):
+            return None
+        with open(self.meta_file) as f:
+            return json.load(f)
+
+    def is_valid(self):
+        meta = self._read_meta()
+        return meta is not None and meta['fingerprint'] == self._fingerprint()
+
+    def _save_array(self, name, array):
+        # Write to a temporary file first, so that concurrent readers
+        # never see a half written column
+        file_path = os.path.join(self.cache_dir, f'{name}.npy')
+        tmp_path = os.path.join(self.cache_dir, f'{name}.{os.getpid()}.tmp.npy')
+        np.save(tmp_path, array, allow_pickle=False)
+        os.replace(tmp_path, file_path)
+
+    def build(self):
+        """
+        Parses the csv files once and writes the columnar cache
+        """
+        print(f'...Building data cache in {self.cache_dir}...')
+        fingerprint = self._fingerprint()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        arrays, columns = to_columnar(pd.read_csv(self.stock_file), pd.read_csv(self.ticker_file))
+        for name, array in arrays.items():
+            self._save_array(name, array)
+
+        # Meta is written last, it marks the cache as complete
+        meta = {'fingerprint' : fingerprint, 'columns' : columns, 'rows' : int(len(arrays['ticker']))}
+        tmp_path = self.meta_file + f'.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_file)
+
+    def _load_array(self, name):
+        return np.load(os.path.join(self.cache_dir, f'{name}.npy'), mmap_mode='r')
+
+    def load(self, columns=None):
+        """
+        Returns the data as a pandas DataFrame and the array of tickers
+        listed in ticker_info.csv. Builds the cache first if needed
+
+        columns : feature columns to be loaded (None : all columns),
+        the other columns are not read at all
+        """
+        if not self.is_valid():
+            self.build()
+
+        meta = self._read_meta()
+        columns = select_columns(meta['columns'], columns)
+        names = ['ticker', 'date_ordinal', 'tickers', 'listed_tickers'] + columns
+        return to_frame({name : self._load_array(name) for name in names}, columns)
+
+
+def get_ticker_universe(listed_tickers, data_tickers):
+    """
+    Returns the array of all tickers, that is the tickers listed in ticker_info.csv
+    and then the sorted tickers which appear only in stock_data.csv
+
+    Tickers listed in ticker_info.csv come first, so that their codes
+    coincide with their position in DataModule.tickers
+    """
+    extra_tickers = np.setdiff1d(np.asarray(data_tickers).astype(str), listed_tickers)
+    return np.concatenate([listed_tickers, extra_tickers])
+
+
+def select_columns(available_columns, columns=None):
+    """
+    Returns the requested columns in the order of available_columns, all if columns is None
+    """
+    if columns is None:
+        return list(available_columns)
+    missing_columns = set(columns) - set(available_columns)
+    assert len(missing_columns) == 0, f'Warning, columns {sorted(missing_columns)} are not available!'
+    return [column for column in available_columns if column in columns]
+
+
+def to_columnar(data, ticker_info, tickers=None):
+    """
+    Converts the raw csv data into the arrays stored by DataCache, sorted by
+    date and then by ticker. Returns the dictionary of arrays and the names
+    of the feature columns
+
+    tickers : array of all tickers (see get_ticker_universe) if data is only
+    a part of stock_data.csv, by default it is computed from data
+    """
+    data['price'] = (data['open'] + data['close']) / 2
+
+    listed_tickers = ticker_info['ticker'].unique().astype(str)
+    if tickers is None:
+        tickers = get_ticker_universe(listed_tickers, data['ticker'].unique())
+    ticker_codes = pd.Categorical(data['ticker'], categories=tickers).codes.astype(np.int32)
+
+    # Dates repeat for every ticker, so only the unique ones are converted
+    date_codes, unique_dates = pd.factorize(data['date'])
+    unique_ordinals = np.array([date.fromisoformat(x).toordinal() for x in unique_dates], dtype=np.int32)
+    date_ordinals = unique_ordinals[date_codes]
+
+    order = np.lexsort((ticker_codes, date_ordinals))
+
+    arrays = {'ticker' : ticker_codes[order], 'date_ordinal' : date_ordinals[order],
+              'tickers' : tickers, 'listed_tickers' : listed_tickers}
+    columns = []
+    for column in data.columns:
+        if column in ['ticker', 'date']:
+            continue
+        if not pd.api.types.is_numeric_dtype(data[column]):
+            print(f'Column {column} is not numeric and is not cached')
+            continue
+        arrays[column] = data[column].to_numpy(np.float32)[order]
+        columns.append(column)
+
+    return arrays, columns
+
+
+def to_frame(arrays, columns):
+    """
+    Builds the DataModule data frame from the arrays produced by to_columnar.
+    Returns the data frame and the array of tickers listed in ticker_info.csv
+    """
+    date_ordinals = np.asarray(arrays['date_ordinal'])
+
+    # Rows are sorted by date, so the isoformat strings of the dates
+    # are computed once per date and repeated over each date block
+    bounds = np.flatnonzero(np.diff(date_ordinals)) + 1
+    starts = np.concatenate([[0], bounds]).astype(np.int64)
+    counts = np.diff(np.concatenate([starts, [len(date_ordinals)]]))
+    date_strings = np.array([date.fromordinal(int(x)).isoformat()
+                             for x in date_ordinals[starts]], dtype=object)
+
+    # Dates are stored as a categorical column, the strings are kept once per date
+    data = {'ticker' : pd.Categorical.from_codes(arrays['ticker'], categories=arrays['tickers']),
+            'date' : pd.Categorical.from_codes(np.repeat(np.arange(len(starts), dtype=np.int32), counts),
+                                               categories=date_strings),
+            'date_ordinal' : date_ordinals}
+    for column in columns:
+        data[column] = arrays[column]
+
+    return pd.DataFrame(data), np.asarray(arrays['listed_tickers']).astype(object)
@@ -1,24 +1,122 @@
 import numpy as np
 import pandas as pd
 import datetime
+from collections import OrderedDict
 from datetime import date, timedelta
+from bisect import bisect_left
+from dateutil.relativedelta import relativedelta
+
+from src.datacache import DataCache, select_columns, to_columnar, to_frame
+from src.panel import Panel
+from src.feature_store import FeatureStore
+
+
+def select_schedule(dates, calendar, frequency):
+    """
+    Returns the trading dates of the frequency given the isoformat dates and
+    the ordinals (calendar) of all trading dates of the interval, see DataModule.get_schedule
+    """
+    assert len(dates) > 0, 'Warning, there are no trading dates in the selected interval!'
+
+    if frequency == 'daily':
+        return list(dates)
+
+    period = {'weekly' : relativedelta(weeks=1), 'monthly' : relativedelta(months=1),
+              'yearly' : relativedelta(years=1)}[frequency]
+
+    selected_dates = [dates[0]]
+    current_date = calendar[0]
+    while current_date < calendar[-1]:
+        next_date = date.fromordinal(int(current_date)) + period
+        position = np.searchsorted(calendar, next_date.toordinal())
+        if position < len(calendar):
+            current_date = calendar[position]
+            selected_dates.append(dates[position])
+        else:
+            current_date = next_date.toordinal()
+            selected_dates.append(next_date.isoformat())
+
+    return selected_dates[:-1]
 
 
 class DataModule():
     start_date_datamodule = '2005-01-04'
 
-    def __init__(self):
-        self.tickers = pd.read_csv('data/ticker_info.csv')['ticker'].unique()
+    def __init__(self, data_dir='data', use_cache=True, panel_features=('price',), columns=None,
+                 max_feature_stores=4):
+        """
+        DataModule loads the stock data from data_dir
+
+        use_cache : if True, the csv files are parsed only once and then loaded
+        from the columnar cache in data_dir/cache (see src/datacache.py),
+        otherwise the csv files are parsed on every run
+
+        panel_features : features stored in the dense date x ticker panel
+        (see src/panel.py), each of them takes dates x tickers x 4 bytes
+
+        columns : feature columns to be loaded, e.g. the required_columns of
+        the strategy (see get_required_columns in src/strategies/registry.py),
+        None loads all columns. The panel features are always loaded
+
+        max_feature_stores : at most max_feature_stores feature stores (see get_feature_store)
+        are kept, the least recently used one is dropped first
+
+        The data keeps ticker and date as categorical columns, the dates as int32
+        ordinals (date_ordinal) and all features as float32, see memory_usage
+        """
+        self.data_dir = data_dir
+        self.use_cache = use_cache
+        self.panel_features = panel_features
+        self.columns = None if columns is None else list(dict.fromkeys(list(panel_features) + list(columns)))
         self.data = self._get_data()
-        self.features = ['open', 'high', 'low', 'close', 'volume', 'outstanding_share',
-                         'turnover', 'pe', 'pe_ttm', 'pb', 'ps', 'ps_ttm', 'dv_ratio',
-                          'dv_ttm', 'total_mv', 'qfq_factor']
+        self.panel = Panel(self.data, self.panel_features)
+        # Memoized trading schedules, see get_schedule
+        self._schedules = {}
+        # Memoized feature stores by date grid, see get_feature_store
+        self.max_feature_stores = max_feature_stores
+        self._feature_stores = OrderedDict()
+        self.features = [feature for feature in ['open', 'high', 'low', 'close', 'volume', 'outstanding_share',
+                                                 'turnover', 'pe', 'pe_ttm', 'pb', 'ps', 'ps_ttm', 'dv_ratio',
+                                                 'dv_ttm', 'total_mv', 'qfq_factor']
+                         if feature in self.data.columns]
 
     def _get_data(self):
-        data = pd.read_csv('data/stock_data.csv')
-        data['price'] = (data['open'] + data['close']) / 2
+        if self.use_cache:
+            # The price column is already stored in the cache
+            data, self.tickers = DataCache(self.data_dir).load(self.columns)
+            return data
+
+        # Without the cache the data is converted to the same layout in memory
+        arrays, columns = to_columnar(pd.read_csv(f'{self.data_dir}/stock_data.csv', usecols=self._get_usecols()),
+                                      pd.read_csv(f'{self.data_dir}/ticker_info.csv'))
+        data, self.tickers = to_frame(arrays, select_columns(columns, self.columns))
         return data
 
+    def _get_usecols(self):
+        """
+        Returns the csv columns needed for self.columns (price is computed from open and close)
+        """
+        if self.columns is None:
+            return None
+        return lambda column: (column in ['ticker', 'date', 'open', 'close']) or (column in self.columns)
+
+    def memory_usage(self, verbose=True):
+        """
+        Returns the memory taken by every column of the data and by the arrays
+        of the panel in bytes, memory-mapped columns are counted in full
+        """
+        usage = self.data.memory_usage(index=True, deep=True)
+        for name in ['row_bounds', 'calendar', 'ticker_codes', 'present', 'values']:
+            usage[f'panel.{name}'] = getattr(self.panel, name).nbytes
+        usage['panel.dates'] = pd.Series(self.panel.dates).memory_usage(index=False, deep=True)
+
+        if verbose:
+            print('...Memory usage of the datamodule...')
+            for name, size in usage.items():
+                print(f'{name:>20} : {size / 2**20:10.2f} MB')
+            print(f'{"Total":>20} : {usage.sum() / 2**20:10.2f} MB')
+        return usage
+
 
     def delete_stocks(self, stocks):
         self.tickers = np.delete(self.tickers, stocks)
@@ -27,22 +125,84 @@ class DataModule():
 
 
     def get_tickers(self, date):
-        return self.data[self.data['date'] == date]['ticker'].unique()
+        position = self.panel.get_position(date)
+        if position is None:
+            return np.array([], dtype=object)
+        start_row, end_row = self.panel.get_rows(position)
+        return self.panel.tickers[self.panel.ticker_codes[start_row:end_row]]
 
 
     def _get_dates(self, ticker, start_date, end_date):
         """
         Returns a numpy array of dates
         """
-        if ticker == 'all':
-            dates = self.data[ ( self.data['date'] >= start_date )
-                    & ( self.data['date'] <= end_date )]['date'].to_numpy()
-        else:
-            dates = self.data[( self.data['ticker'] == ticker ) & ( self.data['date'] >= start_date )
-                    & ( self.data['date'] <= end_date )]['date'].to_numpy()
+        start, end = self.panel.get_range(start_date, end_date)
+        dates = self.panel.dates[start:end]
+        if ticker != 'all':
+            dates = dates[self.panel.present[start:end, self.panel.ticker_index[ticker]]]
 
         return dates
 
+    def get_schedule(self, frequency, start_date, end_date):
+        """
+        Returns the list of trading dates between start_date and end_date
+        for the frequency ('daily', 'weekly', 'monthly' or 'yearly'),
+        see Simulator for the description of frequencies
+
+        Every next date is the previous selected date plus the period, moved
+        forward to the nearest trading date by a search in the trading calendar.
+        The last selected date (the end of the sample) is not included.
+        Schedules are memoized per (frequency, start_date, end_date)
+        """
+        key = (frequency, start_date, end_date)
+        if key in self._schedules:
+            return list(self._schedules[key])
+
+        start, end = self.panel.get_range(start_date, end_date)
+        self._schedules[key] = select_schedule(self.panel.dates[start:end], self.panel.calendar[start:end],
+                                               frequency)
+        return list(self._schedules[key])
+
+    def get_feature_store(self, dates):
+        """
+        Returns the FeatureStore (see src/feature_store.py) of the forward returns and
+        the labels on the date grid dates (e.g. the schedule of the simulator),
+        it is computed once per grid and shared by all strategies and simulators,
+        the stores of the last max_feature_stores grids are kept
+        """
+        key = tuple(dates)
+        if key in self._feature_stores:
+            self._feature_stores.move_to_end(key)
+        else:
+            self._feature_stores[key] = FeatureStore(self.panel, dates)
+            if len(self._feature_stores) > self.max_feature_stores:
+                self._feature_stores.popitem(last=False)
+        return self._feature_stores[key]
+
+    def get_date_block(self, date):
+        """
+        Returns all rows of the date as a slice of self.data
+        """
+        position = self.panel.get_position(date)
+        if position is None:
+            return self.data.iloc[0:0]
+        start_row, end_row = self.panel.get_rows(position)
+        return self.data.iloc[start_row:end_row]
+
+    def get_consecutive_block(self, dates):
+        """
+        Returns all rows of the sorted dates as a single slice of self.data (no copy)
+        if their trading dates are consecutive in the panel, None otherwise
+        """
+        positions = [self.panel.get_position(d) for d in dates]
+        positions = [p for p in positions if p is not None]
+        if len(positions) == 0:
+            return self.data.iloc[0:0]
+
+        if positions[-1] - positions[0] == len(positions) - 1:
+            return self.data.iloc[self.panel.row_bounds[positions[0]]:self.panel.row_bounds[positions[-1] + 1]]
+        return None
+
     @staticmethod
     def choose_weekday(selected_date):
         """
@@ -70,6 +230,9 @@ class DataModule():
         Keeps given dates from the datamodule and delete everything else
         """
         self.data = self.data[~self.data['date'].isin(dates)]
+        self.panel = Panel(self.data, self.panel_features)
+        self._schedules = {}
+        self._feature_stores.clear()
 
     def get_diff_and_current_prices(self, tickers, start_date, end_date):
         """
@@ -81,38 +244,78 @@ class DataModule():
         """
         assert set(tickers).issubset(self.tickers), "Warning! Some tickers are not available."
 
-        prices_start = self.data[( self.data['ticker'].isin(tickers) ) &
-                        ( self.data['date'] == start_date )][['ticker', 'price']]
-        prices_start.set_index('ticker', inplace=True)
+        start_position = self.panel.get_position(start_date)
+        end_position = self.panel.get_position(end_date)
+        if start_position is None:
+            return {}, {}
+
+        tickers = np.asarray(tickers, dtype=object)
+        codes = self.panel.get_codes(tickers)
+        prices = self.panel.get_values('price')
+
+        is_start = self.panel.present[start_position, codes]
+        prices_start = prices[start_position, codes]
+        if end_position is None:
+            prices_diff = np.full(len(codes), np.nan, dtype=prices.dtype)
+        else:
+            prices_diff = prices[end_position, codes] - prices_start
+        is_diff = is_start & ~np.isnan(prices_diff)
+
+        return (dict(zip(tickers[is_diff], prices_diff[is_diff])),
+                dict(zip(tickers[is_start], prices_start[is_start])))
 
-        prices_end = self.data[( self.data['ticker'].isin(tickers) ) &
-                        ( self.data['date'] == end_date )][['ticker', 'price']]
-        prices_end.set_index('ticker', inplace=True)
+    def get_price_vectors(self, start_date, end_date):
+        """
+        Returns diff prices and prices at the start_date of all tickers as vectors
+        aligned with self.panel.tickers (ticker codes), NaN if not available
+        """
+        prices = self.panel.get_values('price')
+        start_position = self.panel.get_position(start_date)
+        end_position = self.panel.get_position(end_date)
 
-        prices_diff = prices_end.subtract(prices_start).dropna()
+        if start_position is None:
+            nan_prices = np.full(len(self.panel.tickers), np.nan, dtype=prices.dtype)
+            return nan_prices, nan_prices.copy()
+        if end_position is None:
+            return np.full(len(self.panel.tickers), np.nan, dtype=prices.dtype), prices[start_position]
 
-        return prices_diff.to_dict()['price'], prices_start.to_dict()['price']
+        return prices[end_position] - prices[start_position], prices[start_position]
 
     def _get_trailing_data(self, dates, number_previous_dates, current_date):
         """
         Gets the trailing data for number_previous_dates time periods from current dates
         over dates.
         """
-        index_current_date = dates.index(current_date)
+        # dates are sorted, so the current date is found by bisection
+        index_current_date = bisect_left(dates, current_date)
         required_dates = dates[max(index_current_date - number_previous_dates, 0):index_current_date]
 
-        return self.data[self.data['date'].isin(required_dates)]
+        data = self.get_consecutive_block(required_dates)
+        if data is not None:
+            return data
+
+        positions = [self.panel.get_position(d) for d in required_dates]
+        return pd.concat([self.data.iloc[self.panel.row_bounds[p]:self.panel.row_bounds[p + 1]]
+                          for p in positions if p is not None])
 
     def get_feature(self, ticker, feature, start_date='2005-01-04', end_date='2022-05-11',
-                    days_from_end_date=None, verbose=False):
+                    verbose=False):
 
         assert ticker in self.tickers, "Warning! Ticker is not available."
         assert feature in self.features, "Warning! Feature is not available."
 
-        dates = self._get_dates(ticker, start_date, end_date, days_from_end_date)
+        start, end = self.panel.get_range(start_date, end_date)
+        code = self.panel.ticker_index[ticker]
+        is_present = self.panel.present[start:end, code]
+        dates = self.panel.dates[start:end][is_present]
 
-        values = self.data[( self.data['ticker'] == ticker ) &
-                 ( self.data['date'].isin(dates) )][feature].to_numpy()
+        if feature in self.panel.features:
+            values = self.panel.get_values(feature)[start:end, code][is_present]
+        else:
+            rows = [self.panel.row_bounds[p] + np.searchsorted(
+                    self.panel.ticker_codes[self.panel.row_bounds[p]:self.panel.row_bounds[p + 1]], code)
+                    for p in np.arange(start, end)[is_present]]
+            values = self.data[feature].to_numpy()[np.array(rows, dtype=np.int64)]
 
         if verbose:
             print(f'Ticker: {ticker}')
@@ -0,0 +1,128 @@
+import numpy as np
+
+from src.strategies.features import rank_returns
+
+
+class FeatureStore():
+    def __init__(self, panel, dates):
+        """
+        FeatureStore keeps the prices, the price changes and the next rows of
+        all tickers on the date grid of the simulator (e.g. the monthly schedule),
+        as (dates x tickers) matrices aligned with panel.tickers. They are computed
+        once per grid and shared by the strategies (labels) and by the simulator (P&L)
+
+        prices : float32 prices at the dates of the grid, NaN if not available
+        present : True if the ticker has a row at the date
+        diff_prices : float32 change of the price to the next date of the grid,
+        used by the simulator as DataModule.get_diff_and_current_prices
+        next_position : int32 position of the next date of the grid with a row of the ticker,
+        len(dates) if there is none, the 'next_price' of prepare_returns is the change
+        of the price to it (see get_forward_diff)
+
+        The matrices take dates x tickers x 13 bytes, the labels are memoized as
+        float32 matrices for every number of bins used
+        """
+        self.panel = panel
+        self.dates = list(dates)
+        self.date_position = {d : idx for idx, d in enumerate(self.dates)}
+
+        positions = np.array([panel.get_position(d) if panel.get_position(d) is not None else -1
+                              for d in self.dates], dtype=np.int64)
+        is_trading = positions >= 0
+        prices = panel.get_values('price')
+
+        self.prices = np.full((len(self.dates), len(panel.tickers)), np.nan, dtype=prices.dtype)
+        self.prices[is_trading] = prices[positions[is_trading]]
+        self.present = np.zeros((len(self.dates), len(panel.tickers)), dtype=bool)
+        self.present[is_trading] = panel.present[positions[is_trading]]
+
+        self.diff_prices = np.full_like(self.prices, np.nan)
+        self.diff_prices[:-1] = self.prices[1:] - self.prices[:-1]
+
+        # Backward pass over the grid: the next row of each ticker
+        self.next_position = np.empty(self.prices.shape, dtype=np.int32)
+        next_position = np.full(len(panel.tickers), len(self.dates), dtype=np.int32)
+        for idx in range(len(self.dates) - 1, -1, -1):
+            self.next_position[idx] = next_position
+            next_position = np.where(self.present[idx], idx, next_position)
+
+        # Memoized label matrices by number of bins
+        self._labels = {}
+
+    def get_rows(self, data):
+        """
+        Returns the positions in the grid of the dates and the ticker codes of the rows of data
+        """
+        dates = data['date'].to_numpy()
+        unique_dates, inverse = np.unique(dates, return_inverse=True)
+        unique_positions = np.array([self.date_position.get(d, -1) for d in unique_dates], dtype=np.int64)
+        positions = unique_positions[inverse]
+        assert np.all(positions >= 0), 'Warning, data has dates which are not in the grid of the feature store!'
+
+        # Codes are looked up once per ticker, not per row
+        unique_tickers, inverse = np.unique(data['ticker'].to_numpy(), return_inverse=True)
+        return positions, self.panel.get_codes(unique_tickers)[inverse]
+
+    def get_forward_diff(self, data):
+        """
+        Returns the change of the price to the next row of the ticker within data
+        for every row of data (NaN for the last row of each ticker), as prepare_returns
+        computes it. data holds consecutive dates of the grid (a trailing window),
+        so the next rows after the last date of data are not used
+        """
+        positions, codes = self.get_rows(data)
+        next_positions = self.next_position[positions, codes]
+        has_next = next_positions <= positions.max()
+
+        forward_diff = np.full(len(positions), np.nan)
+        forward_diff[has_next] = (self.prices[next_positions[has_next], codes[has_next]].astype(np.float64) -
+                                  self.prices[positions[has_next], codes[has_next]].astype(np.float64))
+        return forward_diff
+
+    def get_labels(self, n_tiles):
+        """
+        Returns the (dates x tickers) matrix of the cross-sectional bins of the returns
+        to the next date of the grid (see rank_returns), NaN if the return is not available
+        """
+        if n_tiles not in self._labels:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                returns = self.diff_prices.astype(np.float64) / self.prices
+            labels = np.full(returns.shape, np.nan, dtype=np.float32)
+            for idx in range(len(self.dates)):
+                is_available = np.isfinite(returns[idx])
+                if is_available.sum() >= n_tiles:
+                    labels[idx, is_available] = rank_returns(returns[idx, is_available], n_tiles)
+            self._labels[n_tiles] = labels
+        return self._labels[n_tiles]
+
+    def get_row_labels(self, data, n_tiles):
+        """
+        Returns the cross-sectional labels of the rows of data, NaN for the rows of
+        the last date of data, as their returns are not known at the last date
+        """
+        positions, codes = self.get_rows(data)
+        labels = self.get_labels(n_tiles)[positions, codes]
+        labels[positions == positions.max()] = np.nan
+        return labels
+
+    def get_price_vectors(self, position):
+        """
+        Returns diff prices to the next date of the grid and prices at the date at position
+        as vectors aligned with panel.tickers, as DataModule.get_price_vectors
+        """
+        return self.diff_prices[position], self.prices[position]
+
+    def get_diff_and_current_prices(self, tickers, position):
+        """
+        Returns diff prices of the tickers to the next date of the grid and prices
+        at the date at position as dictionaries, as DataModule.get_diff_and_current_prices
+        """
+        tickers = np.asarray(tickers, dtype=object)
+        codes = self.panel.get_codes(tickers)
+
+        is_start = self.present[position, codes]
+        prices_diff = self.diff_prices[position, codes]
+        is_diff = is_start & ~np.isnan(prices_diff)
+
+        return (dict(zip(tickers[is_diff], prices_diff[is_diff])),
+                dict(zip(tickers[is_start], self.prices[position, codes][is_start])))
@@ -0,0 +1,164 @@
+"""
+Append-only store of the portfolio histories of the simulations
+
+python -m src.history --import_legacy   (copies history.gz into the store)
+python -m src.history -s OLS_median -f monthly   (lists the runs)
+"""
+import sqlite3
+import argparse
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import joblib
+
+
+HISTORY_PATH = 'src/strategies/trade_history/history.db'
+LEGACY_HISTORY_PATH = 'src/strategies/trade_history/history.gz'
+
+
+class HistoryStore():
+    def __init__(self, file_path=HISTORY_PATH, timeout=60):
+        """
+        HistoryStore keeps the histories of the simulations in a SQLite database
+
+        Every saved run is appended as a new row, so a save does not depend on the size
+        of the store, and parallel runs can write at the same time (SQLite serializes
+        the writers, each waits for at most timeout seconds). The metadata of the runs
+        and their portfolio histories are kept in separate tables, so that runs can be
+        queried without reading any portfolio history, and a single history is loaded
+        without deserializing the others. If a key is saved several times, the latest
+        run is returned by load
+        """
+        self.file_path = file_path
+        self.timeout = timeout
+
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS runs ('
+                               'id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, '
+                               'strategy TEXT, frequency TEXT, start_date TEXT, end_date TEXT, '
+                               'sharpe REAL, return_to_drawdown REAL, created_at TEXT)')
+            connection.execute('CREATE TABLE IF NOT EXISTS curves ('
+                               'run_id INTEGER PRIMARY KEY, history_portfolio BLOB NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS runs_key ON runs (key)')
+            connection.execute('CREATE INDEX IF NOT EXISTS runs_strategy ON runs (strategy, frequency)')
+
+    @contextmanager
+    def _connect(self):
+        """
+        Yields a connection, commits the transaction on exit and closes the connection
+        """
+        connection = sqlite3.connect(self.file_path, timeout=self.timeout)
+        try:
+            # Readers do not block the writers and vice versa
+            connection.execute('PRAGMA journal_mode=WAL')
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def save(self, key, history):
+        """
+        Appends the run with history {'history_portfolio', 'sharpe', 'return_to_drawdown',
+        'strategy', 'frequency', 'start_date', 'end_date'} (the last four are optional)
+        """
+        self.save_many({key : history})
+
+    def save_many(self, histories):
+        """
+        Appends all runs of the dictionary {key : history} in one transaction
+        """
+        created_at = datetime.now().isoformat(timespec='seconds')
+        with self._connect() as connection:
+            for key, history in histories.items():
+                cursor = connection.execute(
+                    'INSERT INTO runs (key, strategy, frequency, start_date, end_date, '
+                    'sharpe, return_to_drawdown, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (key, history.get('strategy'), history.get('frequency'), history.get('start_date'),
+                     history.get('end_date'), _to_float(history.get('sharpe')),
+                     _to_float(history.get('return_to_drawdown')), created_at))
+                connection.execute('INSERT INTO curves (run_id, history_portfolio) VALUES (?, ?)',
+                                   (cursor.lastrowid,
+                                    np.asarray(history['history_portfolio'], dtype=np.float64).tobytes()))
+
+    def query(self, strategy=None, frequency=None, start_date=None, end_date=None):
+        """
+        Returns the metadata of the runs (without portfolio histories) of the strategy (e.g. 'OLS_median')
+        and frequency, which start not before start_date and end not after end_date
+        """
+        conditions, parameters = [], []
+        for condition, parameter in [('strategy = ?', strategy), ('frequency = ?', frequency),
+                                     ('start_date >= ?', start_date), ('end_date <= ?', end_date)]:
+            if parameter is not None:
+                conditions.append(condition)
+                parameters.append(parameter)
+
+        sql = ('SELECT id, key, strategy, frequency, start_date, end_date, sharpe, '
+               'return_to_drawdown, created_at FROM runs')
+        if len(conditions) > 0:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+
+        with self._connect() as connection:
+            connection.row_factory = sqlite3.Row
+            return [dict(row) for row in connection.execute(sql + ' ORDER BY id', parameters)]
+
+    def load_curve(self, run_id):
+        with self._connect() as connection:
+            row = connection.execute('SELECT history_portfolio FROM curves WHERE run_id = ?',
+                                     (run_id,)).fetchone()
+        assert row is not None, f'Warning, there is no run with id {run_id}!'
+        return np.frombuffer(row[0], dtype=np.float64)
+
+    def load(self, key):
+        """
+        Returns the history of the latest run with the key
+        """
+        with self._connect() as connection:
+            connection.row_factory = sqlite3.Row
+            row = connection.execute('SELECT * FROM runs WHERE key = ? ORDER BY id DESC LIMIT 1',
+                                     (key,)).fetchone()
+        assert row is not None, f'Warning, there is no run with the key {key}!'
+
+        history = dict(row)
+        history['history_portfolio'] = list(self.load_curve(history.pop('id')))
+        return history
+
+    def keys(self):
+        with self._connect() as connection:
+            return [row[0] for row in connection.execute('SELECT DISTINCT key FROM runs ORDER BY key')]
+
+    def import_legacy(self, file_path=LEGACY_HISTORY_PATH):
+        """
+        Copies all runs of the joblib history file into the store
+        """
+        history = joblib.load(file_path)
+        for key, current_history in history.items():
+            # Keys are built as strategy_frequency_start_date_end_date
+            strategy, frequency, start_date, end_date = key.rsplit('_', 3)
+            current_history.update({'strategy' : strategy, 'frequency' : frequency,
+                                    'start_date' : start_date, 'end_date' : end_date})
+        self.save_many(history)
+        print(f'{len(history)} runs are imported from {file_path}')
+
+
+def _to_float(value):
+    return None if value is None else float(value)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--file_path', default=HISTORY_PATH, type=str)
+    parser.add_argument('--import_legacy', action='store_true', help=f'Import {LEGACY_HISTORY_PATH}')
+    parser.add_argument('-s', '--strategy', default=None, type=str, help='e.g. OLS_median')
+    parser.add_argument('-f', '--frequency', default=None, type=str)
+    parser.add_argument('-start', '--start_date', default=None, type=str)
+    parser.add_argument('-end', '--end_date', default=None, type=str)
+    args = parser.parse_args()
+
+    store = HistoryStore(args.file_path)
+    if args.import_legacy:
+        store.import_legacy()
+
+    for run in store.query(args.strategy, args.frequency, args.start_date, args.end_date):
+        print(f'{run["id"]:>5} | {run["key"]} | Sharpe: {run["sharpe"]:.2f} | '
+              f'Return to Drawdown: {run["return_to_drawdown"]:.2f}')
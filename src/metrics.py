@@ -0,0 +1,208 @@
+"""
+Metrics of the portfolio histories computed with NumPy
+
+All functions take equity curves as an array of values whose last axis is time,
+so a single curve (T,) and a batch of curves (curves x T) are scored the same way,
+e.g. all curves of a sweep in one call. Curves of different lengths are stacked
+with stack_curves, the missing values are NaN and are ignored by the metrics
+"""
+import warnings
+from contextlib import contextmanager
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# Number of rebalancing periods in a year for every frequency of the simulator
+PERIODS_PER_YEAR = {'daily' : 252, 'weekly' : 52, 'monthly' : 12, 'yearly' : 1}
+
+
+def stack_curves(curves):
+    """
+    Returns the (curves x T) array of the equity curves, shorter curves are padded with NaN
+    """
+    length = max(len(curve) for curve in curves)
+    values = np.full((len(curves), length), np.nan)
+    for idx, curve in enumerate(curves):
+        values[idx, :len(curve)] = curve
+    return values
+
+
+def get_periods_per_year(frequency):
+    """
+    Returns the number of periods in a year of the frequency,
+    or the array of them for a list of frequencies (one for every curve)
+    """
+    if isinstance(frequency, str):
+        return PERIODS_PER_YEAR[frequency]
+    return np.array([PERIODS_PER_YEAR[f] for f in frequency], dtype=np.float64)
+
+
+@contextmanager
+def _ignore_empty():
+    # Windows of the padding have no values, their metrics are NaN
+    with warnings.catch_warnings(), np.errstate(divide='ignore', invalid='ignore'):
+        warnings.simplefilter('ignore', RuntimeWarning)
+        yield
+
+
+def _expand(periods, ndim):
+    # The periods of the curves broadcast over the other axes
+    if np.ndim(periods) == 0:
+        return periods
+    return periods.reshape((-1,) + (1,) * (ndim - 1))
+
+
+def period_returns(values):
+    values = np.asarray(values, dtype=np.float64)
+    return values[..., 1:] / values[..., :-1] - 1
+
+
+def annualized_volatility(returns, frequency):
+    periods = get_periods_per_year(frequency)
+    with _ignore_empty():
+        return np.nanstd(returns, axis=-1) * np.sqrt(_expand(periods, np.ndim(returns) - 1))
+
+
+def sharpe_ratio(returns, frequency, risk_free_rate=0.):
+    """
+    Annualized Sharpe ratio of the period returns, risk_free_rate is annual
+    """
+    periods = get_periods_per_year(frequency)
+    excess = returns - risk_free_rate / _expand(periods, np.ndim(returns))
+    with _ignore_empty():
+        ratio = np.nanmean(excess, axis=-1) / np.nanstd(excess, axis=-1)
+    return ratio * np.sqrt(_expand(periods, np.ndim(returns) - 1))
+
+
+def sortino_ratio(returns, frequency, risk_free_rate=0.):
+    """
+    Annualized Sortino ratio of the period returns, the risk is the downside deviation
+    """
+    periods = get_periods_per_year(frequency)
+    excess = returns - risk_free_rate / _expand(periods, np.ndim(returns))
+    with _ignore_empty():
+        downside = np.sqrt(np.nanmean(np.minimum(excess, 0) ** 2, axis=-1))
+        ratio = np.nanmean(excess, axis=-1) / downside
+    return ratio * np.sqrt(_expand(periods, np.ndim(returns) - 1))
+
+
+def drawdown(values):
+    """
+    Returns the drawdowns of the curves, the relative distance from the running maximum
+    """
+    values = np.asarray(values, dtype=np.float64)
+    # fmax skips the NaN of the padding
+    return values / np.fmax.accumulate(values, axis=-1) - 1
+
+
+def max_drawdown(values):
+    """
+    Returns the maximum drawdown as a positive fraction, e.g. .25 for a fall of 25%
+    """
+    with _ignore_empty():
+        return -np.nanmin(drawdown(values), axis=-1)
+
+
+def last_values(values):
+    """
+    Returns the last available value of every curve, the padding is at the end
+    """
+    values = np.asarray(values, dtype=np.float64)
+    last_positions = values.shape[-1] - 1 - np.argmax(~np.isnan(values[..., ::-1]), axis=-1)
+    return np.take_along_axis(values, last_positions[..., None], axis=-1)[..., 0]
+
+
+def total_return(values):
+    values = np.asarray(values, dtype=np.float64)
+    return last_values(values) / values[..., 0] - 1
+
+
+def rolling_sharpe(values, window, frequency, risk_free_rate=0.):
+    """
+    Sharpe ratios of the returns within every window of window periods,
+    the last axis holds the T - window windows
+    """
+    windows = sliding_window_view(period_returns(values), window, axis=-1)
+    return sharpe_ratio(windows, frequency, risk_free_rate)
+
+
+def rolling_max_drawdown(values, window):
+    """
+    Maximum drawdowns within every window of window + 1 values (window periods)
+    """
+    windows = sliding_window_view(np.asarray(values, dtype=np.float64), window + 1, axis=-1)
+    return max_drawdown(windows)
+
+
+def turnover(weights):
+    """
+    Returns the turnover of every rebalancing of the (steps x tickers) weight history,
+    the sum of the absolute changes of the weights (the first step is traded from cash)
+    """
+    weights = np.nan_to_num(np.asarray(weights, dtype=np.float64))
+    previous_weights = np.zeros_like(weights)
+    previous_weights[..., 1:, :] = weights[..., :-1, :]
+    return np.abs(weights - previous_weights).sum(axis=-1)
+
+
+def bootstrap_ci(returns, statistic, number_samples=1000, alpha=.05, seed=0, **kwargs):
+    """
+    Bootstrap confidence intervals of statistic(returns, **kwargs), e.g. sharpe_ratio
+
+    The returns of every curve are resampled with replacement number_samples times
+    in one batch (curves x number_samples x T), then the statistic is computed
+    over the last axis at once. Only the available (not NaN) returns are resampled.
+    The batch takes curves x number_samples x T x 8 bytes
+
+    Returns the (lower, upper) bounds of the 1 - alpha interval for every curve
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    batch = returns.reshape(-1, returns.shape[-1])
+    number_returns = (~np.isnan(batch)).sum(axis=-1)
+
+    rng = np.random.default_rng(seed)
+    # Padding is at the end, so the available returns are the first number_returns of every curve
+    indices = np.floor(rng.random((len(batch), number_samples, batch.shape[-1]))
+                       * number_returns[:, None, None]).astype(np.int64)
+    samples = np.take_along_axis(batch[:, None, :], indices, axis=-1)
+    samples[np.broadcast_to(np.arange(batch.shape[-1]) >= number_returns[:, None, None], samples.shape)] = np.nan
+
+    with _ignore_empty():
+        lower, upper = np.nanquantile(statistic(samples, **kwargs), [alpha / 2, 1 - alpha / 2], axis=-1)
+    # [()] gives floats for a single curve
+    return lower.reshape(returns.shape[:-1])[()], upper.reshape(returns.shape[:-1])[()]
+
+
+def compute_metrics(values, frequency, risk_free_rate=0., weights=None):
+    """
+    Returns the dictionary of metrics of the curves, every metric is a float
+    for a single curve or an array for a batch of curves
+
+    frequency : frequency of the simulator, or a list of them for a batch of curves
+    weights : (steps x tickers) weight history of a single curve, adds the mean turnover
+    """
+    values = np.asarray(values, dtype=np.float64)
+    returns = period_returns(values)
+    metrics = {'total_return' : total_return(values),
+               'volatility' : annualized_volatility(returns, frequency),
+               'sharpe' : sharpe_ratio(returns, frequency, risk_free_rate),
+               'sortino' : sortino_ratio(returns, frequency, risk_free_rate),
+               'max_drawdown' : max_drawdown(values)}
+    if weights is not None:
+        metrics['turnover'] = np.mean(turnover(weights), axis=-1)
+    return metrics
+
+
+def legacy_metrics(values, risk_free_rate=.01):
+    """
+    Returns the Sharpe and the return to drawdown of the report (see Simulator.compute_metrics):
+    the Sharpe is computed on the cumulative returns from the initial value and the
+    return to drawdown is the ratio of the final value to the minimum value
+    """
+    values = np.asarray(values, dtype=np.float64)
+    excess_return = values[..., 1:] / values[..., :1] - 1 - risk_free_rate
+    with _ignore_empty():
+        sharpe = np.nanmean(excess_return, axis=-1) / np.nanstd(excess_return, axis=-1)
+        return_to_drawdown = last_values(values) / np.nanmin(values, axis=-1)
+    return sharpe, return_to_drawdown
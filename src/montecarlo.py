@@ -0,0 +1,199 @@
+"""
+Monte Carlo robustness of a finished run
+
+The run is given by its (steps x tickers) weight history and return matrix
+(Simulator.simulate_vectorized keeps them in self.weights and self.returns).
+Resampled paths are generated from them and the distributions of the metrics
+of the paths show how much of the result of the run could be luck
+
+python -m src.montecarlo -s OLSRatios -d median -f monthly -start 2020-07-01 --paths 10000 -w 4
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.datamodule import DataModule
+from src.portfolio import Portfolio
+from src.simulator import Simulator
+from src.metrics import compute_metrics
+from src.strategies.registry import STRATEGIES, build_strategy, get_required_columns
+
+
+# MonteCarlo of a worker process, see MonteCarlo.run
+_MONTECARLO = None
+
+
+def _init_worker(montecarlo):
+    global _MONTECARLO
+    _MONTECARLO = montecarlo
+
+
+def _score_paths(number_paths, seed):
+    return _MONTECARLO.score_paths(number_paths, seed)
+
+
+class MonteCarlo():
+    def __init__(self, weights, returns, frequency, block_size=3, ticker_fraction=None,
+                 cost_range=(0., 0.), risk_free_rate=.01):
+        """
+        MonteCarlo generates resampled paths of the run in batches, every path is
+        a column of the matrix operations below
+
+        weights, returns : (steps x tickers) weights and returns of the tickers of every step
+        frequency : frequency of the simulator, used to annualize the metrics
+
+        block_size : the steps of a path are drawn as blocks of block_size consecutive
+        steps of the run (block bootstrap of dates), which keeps the short term dependence
+        of the returns, None keeps the steps of the run
+        ticker_fraction : every path trades a random subset of the tickers with this share
+        of the tickers, the weights of the subset are scaled up to the gross exposure of the
+        step, None trades all tickers
+        cost_range : every path pays a proportional transaction cost drawn uniformly from
+        cost_range on its turnover (see turnover in src/metrics.py)
+        """
+        weights = np.nan_to_num(np.asarray(weights, dtype=np.float64))
+        returns = np.nan_to_num(np.asarray(returns, dtype=np.float64))
+        assert weights.shape == returns.shape, 'Warning, weights and returns are not aligned!'
+        self.number_steps = len(weights)
+        self.frequency = frequency
+        self.block_size = None if block_size is None else min(block_size, self.number_steps)
+        self.ticker_fraction = ticker_fraction
+        self.cost_range = cost_range
+        self.risk_free_rate = risk_free_rate
+
+        pnl = weights * returns
+        trades = np.abs(np.diff(weights, axis=0, prepend=0.))
+        # The paths which trade all tickers need only the sums over the tickers of every step
+        self.step_pnl = pnl.sum(axis=1)
+        self.step_trades = trades.sum(axis=1)
+
+        # The subsets of the tickers need the (steps x tickers) matrices,
+        # the exposure of the tickers is abs(weights)
+        if self.ticker_fraction is None:
+            self.weights, self.pnl, self.trades = None, None, None
+        else:
+            self.weights, self.pnl, self.trades = weights, pnl, trades
+
+    @classmethod
+    def from_simulator(cls, simulator, **kwargs):
+        assert simulator.weights is not None, 'Warning, the weights are known only after simulate_vectorized!'
+        return cls(simulator.weights, simulator.returns, simulator.frequency, **kwargs)
+
+    def get_observed(self):
+        """
+        Returns the metrics of the run itself
+        """
+        values = np.concatenate([[1.], np.cumprod(1 + self.step_pnl)])
+        metrics = compute_metrics(values, self.frequency, self.risk_free_rate)
+        # Mean turnover of the weights, see turnover in src/metrics.py
+        metrics['turnover'] = np.mean(self.step_trades)
+        return metrics
+
+    def get_path_returns(self, number_paths, rng):
+        """
+        Returns the (paths x steps) returns of number_paths resampled paths
+        """
+        number_steps = self.number_steps
+
+        if self.ticker_fraction is None:
+            pnl = np.repeat(self.step_pnl[:, None], number_paths, axis=1)
+            trades = np.repeat(self.step_trades[:, None], number_paths, axis=1)
+        else:
+            # (tickers x paths) masks of the traded tickers
+            masks = (rng.random((self.weights.shape[1], number_paths)) < self.ticker_fraction).astype(np.float64)
+            ticker_exposure = np.abs(self.weights)
+            exposure = ticker_exposure @ masks
+            scale = np.divide(ticker_exposure.sum(axis=1)[:, None], exposure,
+                              out=np.zeros(exposure.shape), where=exposure > 0)
+            pnl = (self.pnl @ masks) * scale
+            trades = (self.trades @ masks) * scale
+
+        costs = rng.uniform(self.cost_range[0], self.cost_range[1], number_paths)
+        returns = (pnl - trades * costs).T
+
+        if self.block_size is None:
+            return returns
+
+        number_blocks = -(-number_steps // self.block_size)
+        starts = rng.integers(0, number_steps - self.block_size + 1, (number_paths, number_blocks))
+        indices = (starts[:, :, None] + np.arange(self.block_size)).reshape(number_paths, -1)[:, :number_steps]
+        return np.take_along_axis(returns, indices, axis=1)
+
+    def score_paths(self, number_paths, seed=0):
+        """
+        Returns the dictionary of the metrics of number_paths paths (see compute_metrics)
+        """
+        rng = np.random.default_rng(seed)
+        returns = self.get_path_returns(number_paths, rng)
+        values = np.concatenate([np.ones((number_paths, 1)), np.cumprod(1 + returns, axis=1)], axis=1)
+        return compute_metrics(values, self.frequency, self.risk_free_rate)
+
+    def run(self, number_paths=1000, batch_size=500, workers=1, seed=0):
+        """
+        Returns the dictionary of the metrics of number_paths paths, the paths are
+        generated in batches of batch_size over a pool of workers processes
+        (in the current process if workers is 1). Every batch has its own seed
+        spawned from seed, so the result does not depend on the number of workers
+
+        The matrices of the run are passed to every worker once, when it starts
+        (inherited from the parent with fork), the tasks are only the batch sizes and seeds
+        """
+        batches = [min(batch_size, number_paths - start) for start in range(0, number_paths, batch_size)]
+        seeds = np.random.SeedSequence(seed).spawn(len(batches))
+
+        if workers == 1:
+            results = [self.score_paths(size, batch_seed) for size, batch_seed in zip(batches, seeds)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as executor:
+                results = list(executor.map(_score_paths, batches, seeds))
+
+        return {name : np.concatenate([result[name] for result in results]) for name in results[0].keys()}
+
+
+def print_summary(results, observed, quantiles=(.05, .5, .95)):
+    """
+    Prints the observed metrics of the run, the quantiles of their distributions over the
+    paths and the share of the paths which are worse than the run
+    """
+    print(f'...Printing the distributions over {len(results["sharpe"])} paths...')
+    print(f'{"Metric":>13} | {"Run":>8} | {"Mean":>8} | ' +
+          ' | '.join(f'{f"q{q:.0%}":>8}' for q in quantiles) + f' | {"Worse":>6}')
+    print('-' * (46 + 11 * len(quantiles)))
+    for name in ['total_return', 'sharpe', 'sortino', 'max_drawdown']:
+        values = results[name]
+        # Drawdowns are worse when they are larger
+        worse = np.mean(values > observed[name]) if name == 'max_drawdown' else np.mean(values < observed[name])
+        print(f'{name:>13} | {float(observed[name]):>8.3f} | {np.nanmean(values):>8.3f} | ' +
+              ' | '.join(f'{q:>8.3f}' for q in np.nanquantile(values, quantiles)) + f' | {worse:>6.1%}')
+    print(f'Share of the paths with Sharpe <= 0: {np.mean(results["sharpe"] <= 0):.1%}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s','--strategy', default='OLSRatios', choices=STRATEGIES, type=str)
+    parser.add_argument('-d','--decision_rule', default='median', choices=['median', 'quartile', 'octile'], type=str)
+    parser.add_argument('-t','--type_model', default='regression', choices=['regression', 'classification'], type=str)
+    parser.add_argument('-f','--frequency', default='monthly', choices=['daily', 'weekly', 'monthly', 'yearly'],
+                        type=str)
+    parser.add_argument('-start','--start_date', default='2005-01-04', type=str)
+    parser.add_argument('-end','--end_date', default='2022-05-11', type=str)
+    parser.add_argument('-rf','--risk_free_rate', default=.01, type=float)
+    parser.add_argument('--paths', default=1000, type=int, help='Number of resampled paths')
+    parser.add_argument('--block_size', default=3, type=int, help='Number of consecutive steps of a block, 0 : '
+                                                                 'the dates are not resampled')
+    parser.add_argument('--ticker_fraction', default=None, type=float, help='Share of the tickers traded by a path')
+    parser.add_argument('--max_cost', default=0., type=float,
+                        help='Proportional costs of the paths are drawn from 0 to max_cost')
+    parser.add_argument('-w','--workers', default=1, type=int, help='Choose number of worker processes')
+    parser.add_argument('--seed', default=0, type=int)
+    args = parser.parse_args()
+
+    dm = DataModule(columns=get_required_columns([args.strategy]))
+    sm = Simulator(dm, Portfolio(), build_strategy(args.strategy, args.decision_rule, args.type_model),
+                   args.frequency, args.start_date, args.end_date)
+    sm.simulate_vectorized(verbose=False)
+
+    mc = MonteCarlo.from_simulator(sm, block_size=args.block_size or None, ticker_fraction=args.ticker_fraction,
+                                   cost_range=(0., args.max_cost), risk_free_rate=args.risk_free_rate)
+    print_summary(mc.run(args.paths, workers=args.workers, seed=args.seed), mc.get_observed())
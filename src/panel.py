@@ -0,0 +1,76 @@
+import numpy as np
+
+
+class Panel():
+    def __init__(self, data, features=('price',)):
+        """
+        Panel is the date x ticker index over the data of DataModule, it is
+        built once at load and replaces the boolean scans of the full table
+
+        data must be sorted by date (as it is stored in DataCache), so that
+        all rows of a single date form a contiguous block
+
+        dates : isoformat strings of all trading dates (sorted)
+        calendar : int32 ordinals of all trading dates (sorted)
+        row_bounds : rows of the date at position i are
+        data.iloc[row_bounds[i]:row_bounds[i+1]]
+        ticker_codes : code of the ticker of every row
+        tickers : names of the tickers indexed by their codes
+        present : boolean (dates x tickers) matrix, True if the row exists
+        values : dense float32 (dates x tickers x features) array of features,
+        NaN if the row does not exist
+        """
+        date_ordinals = data['date_ordinal'].to_numpy()
+        assert np.all(np.diff(date_ordinals) >= 0), 'Warning, data is not sorted by date!'
+
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(date_ordinals)) + 1])
+        self.row_bounds = np.concatenate([starts, [len(data)]]).astype(np.int64)
+        self.calendar = date_ordinals[starts]
+        self.dates = data['date'].to_numpy()[starts]
+        self.date_position = {d : idx for idx, d in enumerate(self.dates)}
+
+        self.tickers = np.asarray(data['ticker'].cat.categories, dtype=object)
+        self.ticker_index = {ticker : code for code, ticker in enumerate(self.tickers)}
+        self.ticker_codes = data['ticker'].cat.codes.to_numpy()
+
+        # Position of the date of each row
+        row_dates = np.repeat(np.arange(len(self.dates)), np.diff(self.row_bounds))
+
+        self.present = np.zeros((len(self.dates), len(self.tickers)), dtype=bool)
+        self.present[row_dates, self.ticker_codes] = True
+
+        self.features = list(features)
+        self.values = np.full((len(self.dates), len(self.tickers), len(self.features)),
+                              np.nan, dtype=np.float32)
+        for idx, feature in enumerate(self.features):
+            self.values[row_dates, self.ticker_codes, idx] = data[feature].to_numpy()
+
+    def get_position(self, date):
+        """
+        Returns the position of the date in self.dates or None
+        if the date is not a trading date
+        """
+        return self.date_position.get(date)
+
+    def get_rows(self, position):
+        """
+        Returns the start and the end row of the date at position
+        """
+        return self.row_bounds[position], self.row_bounds[position + 1]
+
+    def get_range(self, start_date, end_date):
+        """
+        Returns the positions of the first and one past the last trading date
+        within the interval [start_date, end_date]
+        """
+        return (np.searchsorted(self.dates, start_date, side='left'),
+                np.searchsorted(self.dates, end_date, side='right'))
+
+    def get_codes(self, tickers):
+        return np.array([self.ticker_index[ticker] for ticker in tickers], dtype=np.int64)
+
+    def get_values(self, feature):
+        """
+        Returns (dates x tickers) view of the feature
+        """
+        return self.values[:, :, self.features.index(feature)]
@@ -1,11 +1,47 @@
+import numpy as np
+
+
+# Changes of positions below the tolerance are rounding errors (see clip_allocations), not trades
+TRADE_TOLERANCE = 1e-12
+
+
+def clip_allocations(weights, max_allocation_long, max_allocation_short):
+    """
+    Applies the maximum allocations to the vector of weights (in their order)
+
+    Once the cumulative long (short) position reaches the maximum allocation, the
+    position is cut at the maximum and all the next long (short) positions are zero,
+    as in Portfolio.allocate_positions. Returns the clipped weights and the total
+    long and short positions
+    """
+    long = np.minimum(np.cumsum(np.where(weights > 0, weights, 0)), max_allocation_long)
+    short = np.minimum(np.cumsum(np.where(weights < 0, -weights, 0)), max_allocation_short)
+
+    if np.sum(weights[weights > 0]) > max_allocation_long:
+        print('Maximum allocation is reached for long!')
+    if -np.sum(weights[weights < 0]) > max_allocation_short:
+        print('Maximum allocation is reached for short!')
+
+    total_long = long[-1] if len(long) > 0 else 0
+    total_short = short[-1] if len(short) > 0 else 0
+    return np.diff(long, prepend=0) - np.diff(short, prepend=0), total_long, total_short
 
 
 class Portfolio():
-    def __init__(self, initial_value=100, max_allocation_long=100, max_allocation_short=100):
+    def __init__(self, initial_value=100, max_allocation_long=100, max_allocation_short=100,
+                 proportional_cost=0., fixed_cost=0., slippage=0.):
         """
         Portfolio class takes the available tickers for the portfolio,
         the initial value of the portfolio, and maximum allocations for
         long and short positions
+
+        Comment on transaction costs:
+        On every allocation only the positions which change are traded, the turnover
+        is the sum of the absolute changes of the positions (shares of the portfolio).
+        The cost of the allocation is
+        value * (proportional_cost + slippage) * turnover + fixed_cost * number of trades,
+        it is paid from the value before the prices change, so the value of the step
+        is (value - cost) * (1 + return). By default trading is free
         """
 
         self.empty_portfolio()
@@ -15,10 +51,19 @@ class Portfolio():
         self.max_allocation_long = max_allocation_long
         self.max_allocation_short = max_allocation_short
 
+        # Costs of trading, proportional ones are shares of the traded value,
+        # the fixed cost is an amount of money per traded ticker
+        self.proportional_cost = proportional_cost
+        self.fixed_cost = fixed_cost
+        self.slippage = slippage
+
         #Value of the portfolio (in amount of money)
         self.value = initial_value
 
         self.value_cache = [self.value]
+        # Turnover and costs of every allocation
+        self.turnover_cache = []
+        self.cost_cache = []
 
     def empty_portfolio(self):
         # Portfolio contains the tickers as keys
@@ -33,16 +78,32 @@ class Portfolio():
         assert ticker in self.portfolio.keys(), "No ticker in portfolio!"
         return self.portfolio[ticker]
 
+    def get_cost(self, trades):
+        """
+        Returns the cost of the vector of changes of the positions
+        """
+        return (self.value * (self.proportional_cost + self.slippage) * np.sum(np.abs(trades)) +
+                self.fixed_cost * len(trades))
+
+    def _pay_costs(self, trades):
+        trades = trades[np.abs(trades) > TRADE_TOLERANCE]
+        cost = self.get_cost(trades)
+        self.value -= cost
+        self.turnover_cache.append(float(np.sum(np.abs(trades))))
+        self.cost_cache.append(cost)
+
     def allocate_positions(self, strategy_portfolio):
         """
         Allocates position to the portfolio and updates total position long
         and total position short
 
-        It also assumes that self.portfolio is an empty dict and
-        total_position_long and total_position_short are zero
+        The portfolio is rebalanced incrementally: only the tickers whose positions
+        change are written (closed positions are removed), and the costs of the
+        changes are paid (see __init__)
         """
-        # Empty the portfolio
-        self.empty_portfolio()
+        positions = {}
+        self.total_position_long = 0
+        self.total_position_short = 0
 
         for ticker, position in strategy_portfolio.items():
             # If long
@@ -62,9 +123,24 @@ class Portfolio():
 
                 self.total_position_short -= position
 
-            # Assign new weight to the portfolio
-            self.portfolio[ticker] = position
+            positions[ticker] = position
+
+        trades = []
+        for ticker, position in positions.items():
+            previous_position = self.portfolio.get(ticker, 0)
+            if position == previous_position:
+                continue
+            trades.append(position - previous_position)
+            if position == 0:
+                del self.portfolio[ticker]
+            else:
+                # Assign new weight to the portfolio
+                self.portfolio[ticker] = position
+        # Close the positions which are not in the new portfolio
+        for ticker in [ticker for ticker in self.portfolio.keys() if ticker not in positions]:
+            trades.append(-self.portfolio.pop(ticker))
 
+        self._pay_costs(np.array(trades, dtype=np.float64))
 
     def update_portfolio(self, diff_prices, start_prices):
         """
@@ -94,3 +170,96 @@ class Portfolio():
         return (f'Total Value Portfolio: {self.value}\n'
                 f'Total Long Position: {self.total_position_long}\n'
                 f'Total Short Position: {self.total_position_long}')
+
+
+class ArrayPortfolio(Portfolio):
+    # The simulator passes price vectors instead of dictionaries to array backed portfolios
+    array_backed = True
+
+    def __init__(self, tickers, initial_value=100, max_allocation_long=100, max_allocation_short=100,
+                 proportional_cost=0., fixed_cost=0., slippage=0.):
+        """
+        ArrayPortfolio is the Portfolio where positions are stored as a NumPy vector
+        indexed by ticker code, that is the position of the ticker in tickers
+        (e.g. datamodule.panel.tickers), so each step is a handful of vector operations
+
+        The strategy portfolio can be either a dictionary {ticker : position}
+        or a vector of positions aligned with tickers
+        """
+        self.tickers = np.asarray(tickers, dtype=object)
+        self.ticker_index = {ticker : code for code, ticker in enumerate(self.tickers)}
+
+        super().__init__(initial_value=initial_value,
+                         max_allocation_long=max_allocation_long,
+                         max_allocation_short=max_allocation_short,
+                         proportional_cost=proportional_cost, fixed_cost=fixed_cost, slippage=slippage)
+
+    def empty_portfolio(self):
+        # Share of the portfolio of each ticker
+        self.positions = np.zeros(len(self.tickers))
+        # Total allocations
+        self.total_position_long = 0
+        self.total_position_short = 0
+
+    @property
+    def portfolio(self):
+        codes = np.flatnonzero(self.positions)
+        return dict(zip(self.tickers[codes], self.positions[codes]))
+
+    def get_position(self, ticker):
+        assert ticker in self.ticker_index, "No ticker in portfolio!"
+        return self.positions[self.ticker_index[ticker]]
+
+    def _to_vector(self, values, fill_value=0.):
+        """
+        Converts a dictionary {ticker : value} to a vector aligned with self.tickers
+        """
+        if isinstance(values, dict):
+            vector = np.full(len(self.tickers), fill_value)
+            codes = np.fromiter((self.ticker_index[ticker] for ticker in values.keys()),
+                                dtype=np.int64, count=len(values))
+            vector[codes] = np.fromiter(values.values(), dtype=np.float64, count=len(values))
+            return vector, codes
+        return np.asarray(values, dtype=np.float64), np.arange(len(self.tickers))
+
+    def allocate_positions(self, strategy_portfolio):
+        """
+        Allocates position to the portfolio and updates total position long
+        and total position short
+
+        Positions are allocated in the order of strategy_portfolio (dictionary order or
+        ticker code order for vectors), see clip_allocations. Only the positions
+        which change are traded and written
+        """
+        weights, codes = self._to_vector(strategy_portfolio)
+        positions = np.zeros(len(self.tickers))
+        positions[codes], self.total_position_long, self.total_position_short = clip_allocations(
+                    weights[codes], self.max_allocation_long, self.max_allocation_short)
+
+        changed = np.flatnonzero(positions != self.positions)
+        trades = positions[changed] - self.positions[changed]
+        self.positions[changed] = positions[changed]
+
+        self._pay_costs(trades)
+
+    def update_portfolio(self, diff_prices, start_prices):
+        """
+        Changes the value of the portfolio for each change in prices
+
+        diff_prices and start_prices are either vectors aligned with self.tickers
+        (NaN if not available) or dictionaries as in Portfolio.update_portfolio.
+        Missing changes in prices are assumed to be zero, and positions
+        without a start price do not change the value
+        """
+        diff_prices, _ = self._to_vector(diff_prices, fill_value=np.nan)
+        start_prices, _ = self._to_vector(start_prices, fill_value=np.nan)
+
+        returns = np.divide(np.nan_to_num(diff_prices), start_prices,
+                            out=np.zeros(len(self.tickers)),
+                            where=(start_prices != 0) & ~np.isnan(start_prices))
+
+        # Change the value by (number of shares) * value change
+        self.value += self.value * np.dot(self.positions, returns)
+
+        # Add the value of the portfolio to value_cache
+        self.value_cache.append(self.value)
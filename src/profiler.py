@@ -0,0 +1,124 @@
+import os
+import csv
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+
+# Phases of a step of the simulator
+PHASES = ['fetch', 'tickers', 'fit', 'predict', 'allocation', 'update']
+
+
+class Profiler():
+    def __init__(self, enabled=True, records_path=None):
+        """
+        Profiler accumulates the wall time and the number of calls of the named
+        phases of the simulation
+
+        fetch : trailing data of the strategy (TrailingWindow), with prefetching
+        (see Simulator.simulate_prefetched) the wait for the data of the step
+        tickers : tickers available at the date
+        fit : training of the model (timed by the strategy)
+        predict : the rest of create_portfolio of the strategy
+        allocation : allocation of the positions to the portfolio
+        update : update of the portfolio value with the latest prices
+
+        Phases can be nested (fit runs inside predict), the time of a phase
+        excludes the time of the phases inside it, so the phases add up to
+        the time of the steps
+
+        records_path : if given, a record with the time of every phase is written
+        for every step, as JSON lines if the file ends with .jsonl, otherwise as csv
+
+        A disabled profiler does not time anything
+        """
+        self.enabled = enabled
+        self.records_path = records_path
+        self.reset()
+
+    def reset(self):
+        self.times = {phase : 0. for phase in PHASES}
+        self.calls = {phase : 0 for phase in PHASES}
+        self.total_time = 0.
+        self.number_steps = 0
+        # Start times and child times of the phases being timed
+        self._stack = []
+        self._record = None
+        self._step_start = None
+
+    def phase(self, name):
+        """
+        Context manager timing the phase
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._time_phase(name)
+
+    @contextmanager
+    def _time_phase(self, name):
+        entry = [time.perf_counter(), 0.]
+        self._stack.append(entry)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - entry[0]
+            if len(self._stack) > 0:
+                self._stack[-1][1] += elapsed
+            exclusive = elapsed - entry[1]
+
+            self.times[name] = self.times.get(name, 0.) + exclusive
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if self._record is not None:
+                self._record[name] = self._record.get(name, 0.) + exclusive
+
+    def start_step(self, step, date):
+        if not self.enabled:
+            return
+        self._record = {'step' : step, 'date' : date}
+        self._step_start = time.perf_counter()
+
+    def end_step(self):
+        if not self.enabled or self._record is None:
+            return
+        elapsed = time.perf_counter() - self._step_start
+        self.total_time += elapsed
+        self.number_steps += 1
+        self._record['total'] = elapsed
+
+        if self.records_path is not None:
+            self._write_record(self._record)
+        self._record = None
+
+    def _write_record(self, record):
+        is_new = not os.path.exists(self.records_path)
+        with open(self.records_path, 'a', newline='') as f:
+            if self.records_path.endswith('.jsonl'):
+                f.write(json.dumps(record) + '\n')
+            else:
+                writer = csv.DictWriter(f, fieldnames=['step', 'date'] + PHASES + ['total'],
+                                        restval=0., extrasaction='ignore')
+                if is_new:
+                    writer.writeheader()
+                writer.writerow(record)
+
+    def summary(self):
+        """
+        Returns the list of (phase, calls, total time, mean time per call) of the timed phases
+        """
+        return [(phase, self.calls[phase], self.times[phase],
+                 self.times[phase] / self.calls[phase] if self.calls[phase] > 0 else 0.)
+                for phase in self.times.keys() if self.calls[phase] > 0]
+
+    def print_summary(self):
+        print('...Printing the timing of the simulation...')
+        print(f'{"Phase":>12} | {"Calls":>6} | {"Total, s":>9} | {"Mean, ms":>9} | {"Share":>6}')
+        print('-' * 54)
+        summary = self.summary()
+        total_phases = sum(total for _, _, total, _ in summary)
+        for phase, calls, total, mean in summary:
+            share = total / total_phases if total_phases > 0 else 0.
+            print(f'{phase:>12} | {calls:>6} | {total:>9.3f} | {mean * 1e3:>9.2f} | {share:>6.1%}')
+        print('-' * 54)
+        print(f'{"Steps":>12} | {self.number_steps:>6} | {self.total_time:>9.3f} | '
+              f'{self.total_time / max(self.number_steps, 1) * 1e3:>9.2f} |')
@@ -1,16 +1,76 @@
+import queue
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-from datetime import date, timedelta
-from dateutil.relativedelta import relativedelta
 
 from tqdm import tqdm
-import os
-import joblib
+
+from src.window import TrailingWindow
+from src.history import HistoryStore, HISTORY_PATH
+from src.portfolio import clip_allocations, TRADE_TOLERANCE
+from src.profiler import Profiler
+from src.metrics import compute_metrics, legacy_metrics
+
+
+def save_histories(histories, file_path=HISTORY_PATH):
+    """
+    Appends the dictionary of histories {key : history} to the history store
+    """
+    HistoryStore(file_path).save_many(histories)
+
+
+def prefetch_iterator(items, size):
+    """
+    Iterates over items in a background thread, up to size items are produced ahead
+    of the consumer into a bounded queue, so producing the next items overlaps with
+    the work on the current one. Errors of the producer are raised in the consumer.
+    If the consumer stops early (or fails), the producer is stopped as well
+    """
+    buffer = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    end = object()
+
+    def put(item):
+        # Waits for a free slot, unless the consumer is gone
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except BaseException as error:
+            put((None, error))
+            return
+        put((end, None))
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is end:
+                break
+            yield item
+    finally:
+        stop.set()
+        producer.join()
 
 
 class Simulator():
 
     def __init__(self, datamodule, portfolio, strategy, frequency='daily',
-                             start_date='2005-01-04', end_date='2022-05-11'):
+                             start_date='2005-01-04', end_date='2022-05-11', profiler=None):
         """
         Simulator class for backtesting various strategies and computing the
         required metrics
@@ -35,6 +95,15 @@ class Simulator():
         self.strategy in self.strategy.required_number_dates.
         That is, there will be a warm up period from the start date by the number of
         intervals defined by self.strategy.required_number_dates
+
+        Comment on feature store:
+        If the datamodule supports it (see DataModule.get_feature_store), the price
+        changes and the forward returns on self.dates are precomputed once, and both
+        the strategy (labels) and the updates of the portfolio read from them
+
+        Comment on profiler:
+        If a Profiler (see src/profiler.py) is given, the time of the phases of
+        every step is accumulated and its summary is printed by compute_metrics
         """
         self.datamodule = datamodule
         self.portfolio = portfolio
@@ -44,9 +113,28 @@ class Simulator():
         self.end_date = end_date
         self.dates = self.get_available_dates()
 
+        # The streaming datamodule does not keep the price panel, it has no feature store
+        if hasattr(self.datamodule, 'get_feature_store'):
+            self.feature_store = self.datamodule.get_feature_store(self.dates)
+        else:
+            self.feature_store = None
+        self.strategy.feature_store = self.feature_store
+        # The strategy returns vectors of weights to the array backed portfolio
+        if getattr(self.portfolio, 'array_backed', False):
+            self.strategy.ticker_index = self.portfolio.ticker_index
+        else:
+            self.strategy.ticker_index = None
+
+        self.profiler = profiler if profiler is not None else Profiler(enabled=False)
+        # The strategy times its training within the steps
+        self.strategy.profiler = self.profiler
+
         # Metrics
         self.sharpe = None
         self.return_to_drawdown = None
+        self.metrics = None
+        # Weight history of simulate_vectorized, see compute_metrics
+        self.weights = None
 
 
 
@@ -58,108 +146,391 @@ class Simulator():
         assert self.frequency in ['daily', 'weekly', 'monthly', 'yearly'], ('Warning, '
                                                      'frequency is chosen incorrectly!')
 
-        dates_remained = self.datamodule._get_dates(ticker='all', start_date=self.start_date,
-                                                    end_date=self.end_date)
+        # The trading calendar is indexed once in the datamodule
+        return self.datamodule.get_schedule(self.frequency, self.start_date, self.end_date)
 
-        if self.frequency == 'daily':
-            return list(dates_remained)
-
-        # Get first a date
-        first_date = dates_remained[0]
-
-        # Compute the remaining dates of the sample
-        selected_dates = [first_date]
-        current_date = first_date
-
-        # Conditions are checked in isoformat
-        while current_date < dates_remained[-1]:
-            current_date = date.fromisoformat(current_date)
-            if self.frequency == 'weekly':
-                current_date += timedelta(weeks=1)
-            elif self.frequency == 'monthly':
-                current_date += relativedelta(months=1)
-            elif self.frequency == 'yearly':
-                current_date += relativedelta(years=1)
-
-            check_date = current_date.isoformat()
-            while (check_date not in dates_remained) and (check_date < dates_remained[-1]):
-                current_date += timedelta(days=1)
-                check_date = current_date.isoformat()
-
-            # Append current_date in isoformat
-            current_date = current_date.isoformat()
-            selected_dates.append(current_date)
-
-        return selected_dates[:-1]
 
+    def simulate(self, verbose=True, progress_bar=True, prefetch=0):
+        """
+        prefetch : if positive, a background thread prepares the trailing data,
+        the available tickers and the prices of up to prefetch next steps while the
+        strategy creates the portfolio of the current step (see simulate_prefetched)
+        """
+        if prefetch > 0:
+            self.simulate_prefetched(prefetch, verbose=verbose, progress_bar=progress_bar)
+            return
 
-    def simulate(self, verbose=True):
+        # The trailing data slides forward by one date on each step
+        window = TrailingWindow(self.datamodule, self.dates, self.strategy.required_number_dates)
 
-        for idx, date in enumerate(tqdm(self.dates, desc='Simulation in progress', ncols=100)):
+        for idx, date in enumerate(tqdm(self.dates, desc='Simulation in progress', ncols=100,
+                                        disable=not progress_bar)):
             if (idx < self.strategy.required_number_dates) or (date == self.dates[-1]):
                 continue
+            self.profiler.start_step(idx, date)
             # Returns the strategy data that is needed to create a portfolio for dates
             # before the current_date
-            strategy_data = self.datamodule._get_trailing_data(
-                                            dates=self.dates,
-                                            number_previous_dates=self.strategy.required_number_dates,
-                                            current_date=date
-                                                                )
+            with self.profiler.phase('fetch'):
+                strategy_data = window.move_to(idx)
 
             # Get tickers that are available to trade at the current_date
-            available_tickers = self.datamodule.get_tickers(date)
+            with self.profiler.phase('tickers'):
+                available_tickers = self.datamodule.get_tickers(date)
             # Returns a dictionary of allocated weights to available tickers
-            strategy_portfolio = self.strategy.create_portfolio(strategy_data, available_tickers)
+            with self.profiler.phase('predict'):
+                strategy_portfolio = self.strategy.create_portfolio(strategy_data, available_tickers)
 
             # Allocates the positions from strategy_portfolio to portfolio
-            self.portfolio.allocate_positions(strategy_portfolio)
+            with self.profiler.phase('allocation'):
+                self.portfolio.allocate_positions(strategy_portfolio)
 
             # Change the portfolio based on the latest prices
-            diff_prices, start_prices = self.datamodule.get_diff_and_current_prices(available_tickers,
-                                                   self.dates[(idx-1)], self.dates[idx])
+            with self.profiler.phase('update'):
+                diff_prices, start_prices = self.get_prices(idx, available_tickers)
+                self.portfolio.update_portfolio(diff_prices, start_prices)
+            self.profiler.end_step()
 
-            self.portfolio.update_portfolio(diff_prices, start_prices)
+        if verbose:
+            self.print_history()
+
+    def fetch_steps(self, steps):
+        """
+        Yields (idx, strategy data, available tickers, (diff prices, start prices))
+        of the steps, all data of a step which does not depend on the strategy
+        """
+        window = TrailingWindow(self.datamodule, self.dates, self.strategy.required_number_dates)
+        for idx in steps:
+            strategy_data = window.move_to(idx)
+            available_tickers = self.datamodule.get_tickers(self.dates[idx])
+            yield idx, strategy_data, available_tickers, self.get_prices(idx, available_tickers)
+
+    def simulate_prefetched(self, prefetch=2, verbose=True, progress_bar=True):
+        """
+        Computes the same portfolio history as simulate, but the data of the steps
+        (see fetch_steps) is prepared by a background thread into a queue of prefetch
+        steps, so fetching the data overlaps with the training and the prediction of
+        the strategy (numpy, pandas, sklearn and torch release the GIL in their heavy parts)
+
+        The data is only read by the producer, the strategy and the portfolio are only
+        used by the main thread. The fetch phase of the profiler is the time the main
+        thread waits for the data
+        """
+        steps = self.get_steps()
+        fetched_steps = prefetch_iterator(self.fetch_steps(steps), prefetch)
+        try:
+            for idx in tqdm(steps, desc='Simulation in progress', ncols=100, disable=not progress_bar):
+                self.profiler.start_step(idx, self.dates[idx])
+                with self.profiler.phase('fetch'):
+                    _, strategy_data, available_tickers, (diff_prices, start_prices) = next(fetched_steps)
+
+                with self.profiler.phase('predict'):
+                    strategy_portfolio = self.strategy.create_portfolio(strategy_data, available_tickers)
+
+                with self.profiler.phase('allocation'):
+                    self.portfolio.allocate_positions(strategy_portfolio)
+
+                with self.profiler.phase('update'):
+                    self.portfolio.update_portfolio(diff_prices, start_prices)
+                self.profiler.end_step()
+        finally:
+            fetched_steps.close()
 
         if verbose:
-            print('...Printing the portfolio history...')
-            print('-' * 24)
-            print('|' + ' ' * 12 + '|' + ' ' * 9 + '|' )
-            print('|    Date    |  Value  |')
-            print('|' + ' ' * 12 + '|' + ' ' * 9 + '|' )
-            print('-' * 24)
-            for date, value in zip(self.dates[self.strategy.required_number_dates:],
-                                   self.portfolio.value_cache):
-                                   print(f'| {date} | {value:6.2f}  |')
-            print('-' * 24)
+            self.print_history()
 
+    def get_prices(self, idx, available_tickers):
+        """
+        Returns diff prices from self.dates[idx-1] to self.dates[idx] and prices at
+        self.dates[idx-1], as vectors for the array backed portfolio, otherwise as dictionaries
+        """
+        array_backed = getattr(self.portfolio, 'array_backed', False)
+        if self.feature_store is not None:
+            if array_backed:
+                return self.feature_store.get_price_vectors(idx - 1)
+            return self.feature_store.get_diff_and_current_prices(available_tickers, idx - 1)
 
-    def compute_metrics(self, risk_free_rate=.01, verbose=True):
-        # Return to Drawdown
-        self.return_to_drawdown = self.portfolio.value_cache[-1] / min(self.portfolio.value_cache)
+        if array_backed:
+            return self.datamodule.get_price_vectors(self.dates[(idx-1)], self.dates[idx])
+        return self.datamodule.get_diff_and_current_prices(available_tickers, self.dates[(idx-1)], self.dates[idx])
+
+    def get_steps(self):
+        """
+        Returns the indices of self.dates at which the portfolio is rebalanced
+        """
+        return [idx for idx, date in enumerate(self.dates)
+                if (idx >= self.strategy.required_number_dates) and (date != self.dates[-1])]
 
-        # Sharpe
-        excess_return = np.array([(val / self.portfolio.value_cache[0] - 1) for val
-                                in self.portfolio.value_cache[1:]]) - risk_free_rate
-        mean = np.mean(excess_return)
-        stdev = np.std(excess_return)
-        self.sharpe = mean / stdev
+    def simulate_vectorized(self, weights=None, verbose=True, progress_bar=True):
+        """
+        Computes the same portfolio history as simulate, but in two passes
+
+        First the weights of all steps are collected from the strategy into
+        a (steps x tickers) matrix aligned with datamodule.panel.tickers,
+        with the maximum allocations applied. Then the returns of all steps
+        are computed from the price matrix and value_cache is the cumulative
+        product of the portfolio returns, net of the transaction costs of the
+        portfolio (see Portfolio.__init__)
+
+        weights : precomputed (steps x tickers) matrix of weights (see get_steps),
+        if given the strategy is not called
+
+        The matrices are kept in self.weights and self.returns
+        """
+        assert self.feature_store is not None, ('Warning, simulate_vectorized needs the in-memory feature '
+                                                'store (not available with streaming)!')
+        steps = self.get_steps()
+
+        if weights is None:
+            weights = self.collect_weights(steps, progress_bar=progress_bar)
+
+        # All steps are updated at once from the matrices of the feature store
+        with self.profiler.phase('update'):
+            positions = [idx - 1 for idx in steps]
+            start_prices = self.feature_store.prices[positions]
+            diff_prices = self.feature_store.diff_prices[positions]
+
+            # Missing changes in prices are zero, positions without a start price do not change the value
+            returns = np.divide(np.nan_to_num(diff_prices), start_prices,
+                                out=np.zeros(start_prices.shape),
+                                where=(start_prices != 0) & ~np.isnan(start_prices))
+
+            portfolio_returns = np.sum(weights * returns, axis=1)
+
+            # Changes of the weights, the first step trades from cash
+            trades = np.diff(weights, axis=0, prepend=np.zeros((1, weights.shape[1])))
+            turnover = np.abs(trades).sum(axis=1)
+            cost_rates = (self.portfolio.proportional_cost + self.portfolio.slippage) * turnover
+        initial_value = self.portfolio.value_cache[0]
+
+        if self.portfolio.fixed_cost == 0:
+            values = initial_value * np.cumprod((1 - cost_rates) * (1 + portfolio_returns))
+            costs = cost_rates * np.concatenate([[initial_value], values[:-1]])
+        else:
+            # Fixed costs do not scale with the value, the steps are chained one by one
+            number_trades = np.count_nonzero(np.abs(trades) > TRADE_TOLERANCE, axis=1)
+            values, costs = np.empty(len(steps)), np.empty(len(steps))
+            value = initial_value
+            for row in range(len(steps)):
+                costs[row] = value * cost_rates[row] + self.portfolio.fixed_cost * number_trades[row]
+                value = (value - costs[row]) * (1 + portfolio_returns[row])
+                values[row] = value
+
+        self.portfolio.value_cache = [initial_value] + list(values)
+        self.portfolio.value = self.portfolio.value_cache[-1]
+        self.portfolio.turnover_cache = list(turnover)
+        self.portfolio.cost_cache = list(costs)
+        self.weights = weights
+        self.returns = returns
+
+        if verbose:
+            self.print_history()
+
+    def collect_weights(self, steps, progress_bar=True):
+        """
+        Returns the (steps x tickers) matrix of weights of the strategy,
+        with the maximum allocations of the portfolio applied
+        """
+        panel = self.datamodule.panel
+        window = TrailingWindow(self.datamodule, self.dates, self.strategy.required_number_dates)
+        weights = np.zeros((len(steps), len(panel.tickers)))
+
+        for row, idx in enumerate(tqdm(steps, desc='Collecting weights', ncols=100,
+                                       disable=not progress_bar)):
+            self.profiler.start_step(idx, self.dates[idx])
+            with self.profiler.phase('fetch'):
+                strategy_data = window.move_to(idx)
+            with self.profiler.phase('tickers'):
+                available_tickers = self.datamodule.get_tickers(self.dates[idx])
+            with self.profiler.phase('predict'):
+                strategy_portfolio = self.strategy.create_portfolio(strategy_data, available_tickers)
+
+            with self.profiler.phase('allocation'):
+                if isinstance(strategy_portfolio, dict):
+                    codes = panel.get_codes(strategy_portfolio.keys())
+                    strategy_weights = np.fromiter(strategy_portfolio.values(), dtype=np.float64,
+                                                   count=len(strategy_portfolio))
+                else:
+                    assert len(strategy_portfolio) == len(panel.tickers), ('Warning, the vector of weights '
+                                                                          'is not aligned with the panel!')
+                    codes = np.arange(len(panel.tickers))
+                    strategy_weights = np.asarray(strategy_portfolio, dtype=np.float64)
+
+                weights[row, codes], _, _ = clip_allocations(strategy_weights, self.portfolio.max_allocation_long,
+                                                             self.portfolio.max_allocation_short)
+            self.profiler.end_step()
+
+        return weights
+
+    def print_history(self):
+        print('...Printing the portfolio history...')
+        print('-' * 24)
+        print('|' + ' ' * 12 + '|' + ' ' * 9 + '|' )
+        print('|    Date    |  Value  |')
+        print('|' + ' ' * 12 + '|' + ' ' * 9 + '|' )
+        print('-' * 24)
+        for date, value in zip(self.dates[self.strategy.required_number_dates:],
+                               self.portfolio.value_cache):
+                               print(f'| {date} | {value:6.2f}  |')
+        print('-' * 24)
+
+
+    def compute_metrics(self, risk_free_rate=.01, verbose=True):
+        """
+        Computes the Sharpe and the return to drawdown of the report (see legacy_metrics
+        in src/metrics.py) and self.metrics with the annualized Sharpe and Sortino ratios
+        of the period returns, the maximum drawdown and, if the weight history is known
+        (simulate_vectorized), the mean turnover
+        """
+        sharpe, return_to_drawdown = legacy_metrics(self.portfolio.value_cache, risk_free_rate)
+        self.sharpe, self.return_to_drawdown = float(sharpe), float(return_to_drawdown)
+        self.metrics = {name : float(value) for name, value in
+                        compute_metrics(self.portfolio.value_cache, self.frequency, risk_free_rate,
+                                        weights=self.weights).items()}
 
         if verbose:
             print(f'Sharpe: {self.sharpe:.2f}')
             print(f'Return to Drawdown: {self.return_to_drawdown:.2f}')
+            print(f'Annualized Sharpe: {self.metrics["sharpe"]:.2f}')
+            print(f'Annualized Sortino: {self.metrics["sortino"]:.2f}')
+            print(f'Maximum Drawdown: {self.metrics["max_drawdown"]:.2%}')
+            if 'turnover' in self.metrics:
+                print(f'Mean Turnover: {self.metrics["turnover"]:.2f}')
+            if self.profiler.enabled:
+                self.profiler.print_summary()
 
-    def save_history(self, file_path='src/strategies/trade_history/history.gz'):
+    def get_history_key(self):
+        return '_'.join([repr(self.strategy), self.frequency, self.start_date, self.end_date])
 
-        key = '_'.join([repr(self.strategy), self.frequency, self.start_date, self.end_date])
-        current_history = {'history_portfolio' : self.portfolio.value_cache, 'sharpe' : self.sharpe,
-                           'return_to_drawdown' : self.return_to_drawdown}
+    def get_history(self):
+        return {'history_portfolio' : self.portfolio.value_cache, 'sharpe' : self.sharpe,
+                'return_to_drawdown' : self.return_to_drawdown, 'metrics' : self.metrics,
+                'strategy' : repr(self.strategy),
+                'frequency' : self.frequency, 'start_date' : self.start_date, 'end_date' : self.end_date}
 
-        if not os.path.exists(file_path):
-            history = {key : current_history}
-            joblib.dump(history, file_path)
-        else:
-            history = joblib.load(file_path)
-            history[key] = current_history
-            joblib.dump(history, file_path)
+    def save_history(self, file_path=HISTORY_PATH):
+
+        key = self.get_history_key()
+        save_histories({key : self.get_history()}, file_path)
 
         print(f'Current model is saved to {file_path} with the key {key}')
+
+
+
+class MultiSimulator():
+
+    def __init__(self, datamodule, runs, frequency='daily', start_date='2005-01-04',
+                 end_date='2022-05-11', profiler=None, num_threads=None):
+        """
+        MultiSimulator runs several strategies side by side in one pass over the dates
+
+        runs : list of (strategy, portfolio) pairs, each pair is simulated by its own
+        Simulator (self.simulators) and has its own portfolio history. The strategies
+        of the same class share their config (see src/strategies/cfg.py), so the runs
+        must be of different strategy classes (which also keeps their history keys apart)
+
+        On every date the trailing data, the available tickers and the prices are fetched
+        once and shared by all strategies, instead of once per Simulator. The strategies
+        do not modify the trailing data, so it is passed to all of them as it is
+
+        num_threads : if greater than 1, the strategies create their portfolios in a
+        thread pool of num_threads threads (the fits of sklearn and torch release the GIL).
+        The profiler then times the creation of all portfolios as one predict phase,
+        as the phases of different threads can not be nested
+        """
+        self.datamodule = datamodule
+        self.frequency = frequency
+        self.start_date = start_date
+        self.end_date = end_date
+        self.num_threads = num_threads
+        self.profiler = profiler if profiler is not None else Profiler(enabled=False)
+
+        self.simulators = [Simulator(datamodule, portfolio, strategy, frequency, start_date, end_date,
+                                     profiler=self.profiler) for strategy, portfolio in runs]
+        self.dates = self.simulators[0].dates
+
+        # Runs of the same class share the config and the history key, one would overwrite the other
+        strategy_classes = [type(simulator.strategy) for simulator in self.simulators]
+        assert len(set(strategy_classes)) == len(strategy_classes), ('Warning, the strategies '
+                                                                     'must be of different classes!')
+        history_keys = [simulator.get_history_key() for simulator in self.simulators]
+        assert len(set(history_keys)) == len(history_keys), 'Warning, the runs have the same history key!'
+
+        if self.num_threads is not None and self.num_threads > 1:
+            for simulator in self.simulators:
+                simulator.strategy.profiler = Profiler(enabled=False)
+
+    def _create_portfolios(self, simulators, windows, available_tickers, executor):
+        def create_portfolio(simulator):
+            strategy = simulator.strategy
+            return strategy.create_portfolio(windows[strategy.required_number_dates], available_tickers)
+
+        if executor is None:
+            return [create_portfolio(simulator) for simulator in simulators]
+        return list(executor.map(create_portfolio, simulators))
+
+    def simulate(self, verbose=True, progress_bar=True):
+        # One trailing window for every number of dates required by the strategies
+        windows = {number_dates : TrailingWindow(self.datamodule, self.dates, number_dates)
+                   for number_dates in set(sm.strategy.required_number_dates for sm in self.simulators)}
+
+        use_threads = self.num_threads is not None and self.num_threads > 1
+        with ThreadPoolExecutor(self.num_threads) if use_threads else nullcontext() as executor:
+            for idx, date in enumerate(tqdm(self.dates, desc='Simulation in progress', ncols=100,
+                                            disable=not progress_bar)):
+                simulators = [sm for sm in self.simulators if idx >= sm.strategy.required_number_dates]
+                if (len(simulators) == 0) or (date == self.dates[-1]):
+                    continue
+                self.profiler.start_step(idx, date)
+
+                with self.profiler.phase('fetch'):
+                    strategy_data = {number_dates : windows[number_dates].move_to(idx)
+                                     for number_dates in set(sm.strategy.required_number_dates
+                                                             for sm in simulators)}
+
+                with self.profiler.phase('tickers'):
+                    available_tickers = self.datamodule.get_tickers(date)
+
+                with self.profiler.phase('predict'):
+                    strategy_portfolios = self._create_portfolios(simulators, strategy_data,
+                                                                  available_tickers, executor)
+
+                with self.profiler.phase('allocation'):
+                    for simulator, strategy_portfolio in zip(simulators, strategy_portfolios):
+                        simulator.portfolio.allocate_positions(strategy_portfolio)
+
+                with self.profiler.phase('update'):
+                    # Prices are fetched once as dictionaries and once as vectors at most
+                    prices = {}
+                    for simulator in simulators:
+                        array_backed = getattr(simulator.portfolio, 'array_backed', False)
+                        if array_backed not in prices:
+                            prices[array_backed] = simulator.get_prices(idx, available_tickers)
+                        simulator.portfolio.update_portfolio(*prices[array_backed])
+                self.profiler.end_step()
+
+        if verbose:
+            for simulator in self.simulators:
+                print(f'...{repr(simulator.strategy)}...')
+                simulator.print_history()
+
+    def compute_metrics(self, risk_free_rate=.01, verbose=True):
+        for simulator in self.simulators:
+            simulator.compute_metrics(risk_free_rate=risk_free_rate, verbose=False)
+
+        if verbose:
+            print(f'{"Strategy":>30} | {"Sharpe":>7} | {"Return to Drawdown":>18}')
+            print('-' * 62)
+            for simulator in self.simulators:
+                print(f'{repr(simulator.strategy):>30} | {simulator.sharpe:>7.2f} | '
+                      f'{simulator.return_to_drawdown:>18.2f}')
+            if self.profiler.enabled:
+                self.profiler.print_summary()
+
+    def get_histories(self):
+        return {simulator.get_history_key() : simulator.get_history() for simulator in self.simulators}
+
+    def save_history(self, file_path=HISTORY_PATH):
+        histories = self.get_histories()
+        save_histories(histories, file_path)
+
+        print(f'Current models are saved to {file_path} with the keys {list(histories.keys())}')
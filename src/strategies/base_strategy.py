@@ -1,5 +1,10 @@
 from abc import ABC, abstractmethod
 
+import numpy as np
+
+from src.profiler import Profiler
+from src.strategies.decision_rules import to_portfolio, to_ticker_vector
+
 
 class BaseStrategy(ABC):
     """
@@ -13,20 +18,177 @@ class BaseStrategy(ABC):
 
         def create_portfolio(self, strategy_data, available_tickers)  -> dict:
             # Some code
+
+    required_columns lists the feature columns of the data used by the strategy,
+    so that DataModule loads only those (None : all columns)
     """
-    def __init__(self, requires_diff_data=None, required_number_dates=None):
+    required_columns = None
+
+    def __init__(self, requires_diff_data=None, required_number_dates=None,
+                 retrain_every=None, retrain_calendar=None, retrain_drift=None):
+        """
+        Retraining schedule (by default the model is trained only once on the first dates):
+        retrain_every : retrain the model every retrain_every steps
+        retrain_calendar : retrain the model on the first step of each
+        'month', 'quarter' or 'year'
+        retrain_drift : retrain the model if the mean absolute z-score (computed
+        by self.scaler of the last training) of the means of the latest features
+        exceeds retrain_drift
+
+        Child strategies call update_train_interval before creating the portfolio,
+        then train the model if self.train_interval is True and call mark_trained
+        """
         self.requires_diff_data = requires_diff_data
         self.required_number_dates = required_number_dates
 
         if (self.required_number_dates == None) or (self.required_number_dates <= 1):
             raise NotImplementedError('Strategy must set the value for required_number_dates (int >= 2)!')
 
+        assert retrain_calendar in [None, 'month', 'quarter', 'year'], ('Warning, '
+                                               'retrain_calendar is chosen incorrectly!')
+        self.retrain_every = retrain_every
+        self.retrain_calendar = retrain_calendar
+        self.retrain_drift = retrain_drift
+
+        self.train_interval = True
+        self.last_training_date = None
+        self.steps_since_training = 0
+
+        # The simulator replaces it with its own profiler (see src/profiler.py)
+        self.profiler = Profiler(enabled=False)
+
+        # Precomputed returns and labels of the date grid, set by the simulator (see src/feature_store.py)
+        self.feature_store = None
+
+        # Ticker codes {ticker : code} of the array backed portfolio, set by the simulator,
+        # the strategy portfolio is then a vector of weights aligned with the codes (see to_weights)
+        self.ticker_index = None
+
+        # Fitted models are reused from the cache if it is set (see src/strategies/model_cache.py)
+        self.model_cache = None
+        self._model_key = None
+
+    def _get_label_store(self, labels):
+        """
+        Returns the feature store whose labels are used, None for the labels pooled over the window
+        """
+        assert labels in ['pooled', 'cross_sectional'], 'Warning, labels are chosen incorrectly!'
+        if labels == 'pooled':
+            return None
+        assert self.feature_store is not None, 'Warning, cross-sectional labels require the feature store!'
+        return self.feature_store
+
+    def to_weights(self, tickers, weights):
+        """
+        Returns the strategy portfolio of the weights of the tickers, the dictionary
+        {ticker : weight} or, for the array backed portfolio, the vector of weights
+        aligned with its ticker codes, so no dictionary is built and converted back
+        """
+        if self.ticker_index is None:
+            return to_portfolio(tickers, weights)
+        codes = np.fromiter((self.ticker_index[ticker] for ticker in tickers), dtype=np.int64, count=len(tickers))
+        return to_ticker_vector(codes, weights, len(self.ticker_index))
+
+    @staticmethod
+    def _calendar_period(date, retrain_calendar):
+        year, month = int(date[:4]), int(date[5:7])
+        if retrain_calendar == 'month':
+            return year, month
+        elif retrain_calendar == 'quarter':
+            return year, (month - 1) // 3
+        return year
+
+    def _detect_drift(self, latest_x):
+        if len(latest_x) == 0:
+            return False
+        scaled_x = self.scaler.transform(latest_x)
+        return np.abs(np.nanmean(scaled_x, axis=0)).mean() > self.retrain_drift
+
+    def update_train_interval(self, latest_date, latest_x=None):
+        """
+        Sets self.train_interval to True if the model must be (re)trained
+        at latest_date according to the retraining schedule
+        """
+        if self.last_training_date is None:
+            self.train_interval = True
+            return self.train_interval
+
+        self.steps_since_training += 1
+
+        if (self.retrain_every is not None) and (self.steps_since_training >= self.retrain_every):
+            self.train_interval = True
+
+        elif (self.retrain_calendar is not None) and \
+             (self._calendar_period(latest_date, self.retrain_calendar) !=
+              self._calendar_period(self.last_training_date, self.retrain_calendar)):
+            self.train_interval = True
+
+        elif (self.retrain_drift is not None) and (latest_x is not None) and self._detect_drift(latest_x):
+            self.train_interval = True
+
+        return self.train_interval
+
+    def mark_trained(self, latest_date):
+        self.train_interval = False
+        self.last_training_date = latest_date
+        self.steps_since_training = 0
+
+    def fit_model(self, train_x, train_y, train_dates):
+        """
+        Fits the model on train_x, train_y of train_dates with self._fit
+
+        If self.model_cache is set, the model is restored from the cache when
+        it was already fitted on the same data with the same training config
+        (self._get_train_config), otherwise it is fitted and added to the cache.
+        With warm start the key includes the key of the previous model, as the
+        fit starts from it
+        """
+        if self.model_cache is None:
+            self._fit(train_x, train_y)
+            return
+
+        config = self._get_train_config()
+        previous_key = self._model_key if config.get('warm_start', False) else None
+        key = self.model_cache.get_key(type(self).__name__, config, train_dates,
+                                       train_x, train_y, previous_key)
+
+        model = self.model_cache.load(key)
+        if model is None:
+            self._fit(train_x, train_y)
+            self.model_cache.save(key, self._get_model())
+        else:
+            self._set_model(model)
+        self._model_key = key
+
+    def _fit(self, train_x, train_y):
+        raise NotImplementedError('Strategy must implement _fit to use fit_model!')
+
+    def _get_model(self):
+        """
+        Returns the fitted model (anything that can be pickled) to be cached
+        """
+        raise NotImplementedError('Strategy must implement _get_model to use the model cache!')
+
+    def _set_model(self, model):
+        """
+        Restores the model returned by _get_model
+        """
+        raise NotImplementedError('Strategy must implement _set_model to use the model cache!')
+
+    def _get_train_config(self):
+        """
+        Returns the dictionary of the config fields which change the fitted model
+        """
+        raise NotImplementedError('Strategy must implement _get_train_config to use the model cache!')
+
     @abstractmethod
     def create_portfolio(self, strategy_data, available_tickers) -> dict:
         pass
 
 
 class TestStrategy(BaseStrategy):
+    required_columns = ['price']
+
     def __init__(self, **kwargs):
         super().__init__(required_number_dates=2)
 
@@ -1,19 +1,33 @@
 class OLSCFG:
     required_number_dates = 6
     decision_rule = 'median'
+    weighting = 'equal' # 'rank' : positions weighted by their rank within the long and short legs
+    # Retraining schedule, by default the model is trained only once
+    retrain_every = None # retrain every N steps
+    retrain_calendar = None # 'month', 'quarter', 'year'
+    retrain_drift = None # threshold of the mean absolute z-score of the latest features
 
 
 class LogRegCFG:
     required_number_dates = 6
     decision_rule = 'octile'
+    weighting = 'equal' # 'rank' : positions weighted by their rank within the long and short legs
     penalty = 'none'
     regularize_strength = .001
+    # Retraining schedule, by default the model is trained only once
+    retrain_every = None # retrain every N steps
+    retrain_calendar = None # 'month', 'quarter', 'year'
+    retrain_drift = None # threshold of the mean absolute z-score of the latest features
+    warm_start = True # continue from the previous coefficients when retraining
+    labels = 'pooled' # 'cross_sectional' : bins of the returns within each date (see src/feature_store.py)
 
 
 class NNCFG:
     required_number_dates = 6
     type_model = 'regression' # 'classification'
     decision_rule = 'median'
+    weighting = 'equal' # 'rank' : positions weighted by their rank within the long and short legs
+    labels = 'pooled' # 'cross_sectional' : bins of the returns within each date (see src/feature_store.py)
     hidden_shape = 128
     learning_rate = 1e-2
     momentum = 0.4
@@ -23,3 +37,14 @@ class NNCFG:
     log_frequency = 50
     epochs = 3
     val_check_interval = 1.0
+    # Retraining schedule, by default the model is trained only once
+    retrain_every = None # retrain every N steps
+    retrain_calendar = None # 'month', 'quarter', 'year'
+    retrain_drift = None # threshold of the mean absolute z-score of the latest features
+    warm_start = True # continue from the previous weights when retraining
+    engine = 'lightning' # 'lean' : plain torch training loop without Lightning
+    lean_batch_size = 4096 # batch size of the lean engine, None : full batch
+    num_threads = None # torch.set_num_threads, None : torch default
+    compile_inference = None # 'script' : TorchScript, 'compile' : torch.compile (torch >= 2.0)
+    ensemble_size = 1 # number of models trained as one batched ensemble
+    ensemble_seed = 0 # seed of the first model of the ensemble
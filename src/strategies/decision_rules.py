@@ -0,0 +1,110 @@
+import numpy as np
+
+from src.strategies.features import N_TILES
+
+
+WEIGHTINGS = ['equal', 'rank']
+
+
+def get_n_tiles(decision_rule):
+    """
+    Number of bins of the decision rule, decision_rule is 'median',
+    'quartile', 'octile' or an integer number of bins
+    """
+    n_tiles = N_TILES[decision_rule] if isinstance(decision_rule, str) else int(decision_rule)
+    assert n_tiles >= 2, 'Warning, decision rule must have at least 2 bins!'
+    return n_tiles
+
+
+def get_leg_sizes(number_scores, decision_rule):
+    """
+    Returns the number of long and short positions of the decision rule
+
+    They are the numbers of scores strictly above the upper quantile (1 - 1/n)
+    and strictly below the lower quantile (1/n) as given by np.quantile with
+    linear interpolation (for distinct scores), e.g. for the median of 5 scores
+    2 are long, 2 are short and the middle one is not traded
+    """
+    if number_scores == 0:
+        return 0, 0
+    n_tiles = get_n_tiles(decision_rule)
+    upper = (1 - 1 / n_tiles) * (number_scores - 1)
+    lower = 1 / n_tiles * (number_scores - 1)
+    # The tolerance keeps exact positions exact, e.g. 3/4 * 8 is 6 and not 5.999...
+    number_long = number_scores - 1 - int(np.floor(upper + 1e-9))
+    number_short = int(np.ceil(lower - 1e-9))
+    return number_long, number_short
+
+
+def _leg_weights(scores, index, sign, weighting):
+    """
+    Weights of one leg of the positions summing up to sign
+    """
+    if weighting == 'equal':
+        return np.full(len(index), sign / len(index))
+    # Rank weights: the best score of the leg gets the largest weight
+    ranks = np.empty(len(index))
+    ranks[np.argsort(sign * scores[index], kind='mergesort')] = np.arange(1, len(index) + 1)
+    return sign * ranks / ranks.sum()
+
+
+def long_short_weights(scores, decision_rule, weighting='equal'):
+    """
+    Returns the weights of the positions aligned with scores (e.g. predicted returns)
+
+    The scores above the upper quantile of the decision rule are long and sum up to 1,
+    the scores below the lower quantile are short and sum up to -1, the other weights
+    are zero. The legs are selected with np.argpartition, so no quantile and no
+    sort of all scores are computed
+
+    weighting : 'equal' or 'rank' (weights proportional to the rank within the leg)
+    """
+    assert weighting in WEIGHTINGS, 'Warning, weighting is chosen incorrectly!'
+    scores = np.asarray(scores, dtype=np.float64).ravel()
+    weights = np.zeros(len(scores))
+
+    number_long, number_short = get_leg_sizes(len(scores), decision_rule)
+    if number_long > 0:
+        index = np.argpartition(scores, len(scores) - number_long)[len(scores) - number_long:]
+        weights[index] = _leg_weights(scores, index, 1, weighting)
+    if number_short > 0:
+        index = np.argpartition(scores, number_short - 1)[:number_short]
+        weights[index] = _leg_weights(scores, index, -1, weighting)
+    return weights
+
+
+def bin_weights(bins, decision_rule, scores=None, weighting='equal'):
+    """
+    Returns the weights of the positions aligned with predicted bins (as given by
+    rank_returns), the highest bin is long and the lowest bin is short
+
+    scores : confidence of the predictions used by the rank weighting
+    (e.g. the expected bin), by default the bins themselves
+    """
+    assert weighting in WEIGHTINGS, 'Warning, weighting is chosen incorrectly!'
+    bins = np.asarray(bins).ravel()
+    scores = bins.astype(np.float64) if scores is None else np.asarray(scores, dtype=np.float64).ravel()
+    weights = np.zeros(len(bins))
+
+    for bin_value, sign in [(get_n_tiles(decision_rule) - 1, 1), (0, -1)]:
+        index = np.flatnonzero(bins == bin_value)
+        if len(index) > 0:
+            weights[index] = _leg_weights(scores, index, sign, weighting)
+    return weights
+
+
+def to_ticker_vector(codes, weights, number_tickers):
+    """
+    Scatters the weights of the rows with ticker codes into a vector
+    aligned with the ticker codes (e.g. datamodule.panel.tickers)
+    """
+    vector = np.zeros(number_tickers)
+    vector[np.asarray(codes)] = weights
+    return vector
+
+
+def to_portfolio(tickers, weights):
+    """
+    Returns the strategy portfolio {ticker : weight}
+    """
+    return dict(zip(np.asarray(tickers), weights))
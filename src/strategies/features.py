@@ -0,0 +1,79 @@
+import numpy as np
+
+
+# Number of bins of the returns for every decision rule
+N_TILES = {'median' : 2, 'quartile' : 4, 'octile' : 8}
+
+# Accounting ratios used as the inputs of the ratio strategies
+RATIO_COLUMNS = ['outstanding_share', 'turnover', 'pe', 'pe_ttm', 'pb',
+                 'ps', 'ps_ttm', 'dv_ratio', 'dv_ttm', 'total_mv', 'qfq_factor']
+
+
+def prepare_returns(strategy_data, fill_na=False, feature_store=None, columns=RATIO_COLUMNS):
+    """
+    Computes the next period return of every row of strategy_data in one pass,
+    it is shared by all the ratio strategies
+
+    The data is sorted once by ticker and date, then the next price of each row
+    is the price of the following row if it belongs to the same ticker. As before
+    'next_price' holds the change of the price to the next date of the ticker and
+    'return' is computed as next_price / price - 1
+
+    fill_na : if True, all missing values are filled with zeros (as used by NNRatios),
+    otherwise the rows with a missing value in columns (the inputs of the strategy),
+    the price or the return are dropped, whichever other columns are loaded
+
+    feature_store : FeatureStore of the date grid of strategy_data (see src/feature_store.py),
+    if given the changes of the prices are read from its precomputed matrices
+    """
+    data = strategy_data.sort_values(by=['ticker', 'date'], kind='mergesort')
+
+    prices = data['price'].to_numpy(dtype=np.float64)
+
+    if feature_store is not None:
+        next_price = feature_store.get_forward_diff(data)
+    else:
+        # Grouped shift: the last row of each ticker has no next price
+        tickers = data['ticker'].to_numpy()
+        next_price = np.full(len(data), np.nan)
+        same_ticker = tickers[1:] == tickers[:-1]
+        next_price[:-1] = np.where(same_ticker, prices[1:] - prices[:-1], np.nan)
+
+    data = data.assign(next_price=next_price, **{'return' : next_price / prices - 1})
+
+    if fill_na:
+        # Only numeric columns are filled, ticker is a categorical column
+        return data.fillna({column : 0 for column in data.select_dtypes('number').columns})
+    return data.dropna(subset=list(columns) + ['price', 'next_price', 'return'])
+
+
+def rank_returns(returns, decision_rule):
+    """
+    Puts returns in bins given by the quantiles of the decision rule,
+    e.g. quartile returns the bins 0, 1, 2, 3
+    """
+    n_tiles = N_TILES[decision_rule] if isinstance(decision_rule, str) else decision_rule
+    returns = np.asarray(returns, dtype=np.float64)
+
+    bins = np.concatenate([[returns.min()],
+                           np.quantile(returns, np.linspace(1 / n_tiles, 1 - 1 / n_tiles, n_tiles - 1))])
+
+    return np.digitize(returns, bins) - 1
+
+
+def label_returns(data, decision_rule, feature_store=None):
+    """
+    Returns data with the bins of the returns in 'ranking'
+
+    Without feature_store the bins are given by the quantiles of all returns of data
+    (see rank_returns). With feature_store the bins precomputed within each date of
+    the grid are used (cross-sectional labels, see FeatureStore.get_labels) and the
+    rows without a label are dropped
+    """
+    n_tiles = N_TILES[decision_rule] if isinstance(decision_rule, str) else decision_rule
+    if feature_store is None:
+        return data.assign(ranking=rank_returns(data['return'], n_tiles))
+
+    labels = feature_store.get_row_labels(data, n_tiles)
+    is_labeled = ~np.isnan(labels)
+    return data[is_labeled].assign(ranking=labels[is_labeled].astype(np.int64))
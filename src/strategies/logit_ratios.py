@@ -5,10 +5,16 @@ from sklearn.linear_model import LogisticRegression
 
 from src.strategies.base_strategy import BaseStrategy
 from src.strategies.cfg import LogRegCFG
+from src.strategies.model_cache import get_cfg_fields
+from src.strategies.features import prepare_returns, label_returns, RATIO_COLUMNS
+from src.strategies.decision_rules import bin_weights
 
 from sklearn.preprocessing import StandardScaler
 
 class LogitRatios(BaseStrategy):
+    # Columns of the data used by the strategy
+    required_columns = ['price'] + RATIO_COLUMNS
+
     def __init__(self):
         """
         LogitRatios implements the trading strategy using the logistic regression
@@ -28,61 +34,44 @@ class LogitRatios(BaseStrategy):
         'octile' <- the same strategy as for 'quartile' but using
         the octiles for decision rules
 
-        train_interval : specifies the intervals when the linear
-        regression must be trained before being evaluated, otherwise
-        the pretrained regression is used
+        train_interval : specifies the intervals when the model must be
+        trained before being evaluated, otherwise the pretrained model is used.
+        The intervals are set by the retraining schedule in the config
+        (see BaseStrategy), by default the model is trained only once
 
         Comment on data preprocessing: it is all scaled by StandardScaler
         before training and inference
         """
-        super().__init__(required_number_dates=LogRegCFG.required_number_dates)
+        super().__init__(required_number_dates=LogRegCFG.required_number_dates,
+                         retrain_every=LogRegCFG.retrain_every,
+                         retrain_calendar=LogRegCFG.retrain_calendar,
+                         retrain_drift=LogRegCFG.retrain_drift)
 
         self.decision_rule = LogRegCFG.decision_rule
         assert self.decision_rule in ['median', 'quartile', 'octile'], ('Warning,'
                                          'Decision rule is specified incorrectly!')
         self.reg = LogisticRegression(multi_class='multinomial',
                                       penalty=LogRegCFG.penalty,
-                                      C=LogRegCFG.regularize_strength)
-
-        self.train_interval = True
+                                      C=LogRegCFG.regularize_strength,
+                                      warm_start=LogRegCFG.warm_start)
 
         self.column_y = 'ranking'
-        self.columns_x = ['outstanding_share', 'turnover', 'pe', 'pe_ttm', 'pb',
-                          'ps', 'ps_ttm', 'dv_ratio', 'dv_ttm', 'total_mv', 'qfq_factor']
+        self.columns_x = list(RATIO_COLUMNS)
 
     def __repr__(self):
-        return '_'.join(['LogReg', LogRegCFG.decision_rule])
+        name = ['LogReg', LogRegCFG.decision_rule]
+        if LogRegCFG.weighting != 'equal':
+            name.append(LogRegCFG.weighting)
+        return '_'.join(name)
 
     def _prepare_data(self, strategy_data):
-        new_df = pd.DataFrame(columns=strategy_data.columns)
-        for ticker in strategy_data['ticker'].unique():
-            current_df = strategy_data[strategy_data['ticker'] == ticker]
-            current_df = current_df.sort_values(by=['date'])
-            current_df['next_price'] = current_df['price'].diff().shift(-1)
-            current_df['return'] = current_df.apply(lambda x: x['next_price'] / x['price'] - 1, axis=1)
-            current_df = current_df.dropna()
-            new_df = pd.concat([new_df, current_df])
-
-
+        new_df = prepare_returns(strategy_data, feature_store=self.feature_store, columns=self.columns_x)
 
         # Put returns in bins
-        min_return = new_df['return'].min()
-        if self.decision_rule == 'median':
-            bins = [min_return, np.median(new_df['return'])]
-        elif self.decision_rule == 'quartile':
-            bins = [min_return]
-            for idx in np.linspace(0.25,.75, 3):
-                bins.append(np.quantile(new_df['return'], idx))
-        elif self.decision_rule == 'octile':
-            bins = [min_return]
-            for idx in np.linspace(0.125,.875, 7):
-                bins.append(np.quantile(new_df['return'], idx))
-
-        new_df['ranking'] = np.digitize(new_df['return'], bins)
-        new_df['ranking'] -= 1
+        new_df = label_returns(new_df, self.decision_rule, self._get_label_store(LogRegCFG.labels))
 
         train_y = new_df[self.column_y]
-        train_x = new_df[self.columns_x]
+        train_x = new_df[self.columns_x].astype(np.float64)
 
         # Normalise data
         self.scaler = StandardScaler()
@@ -91,17 +80,33 @@ class LogitRatios(BaseStrategy):
         return train_x, train_y
 
 
-    def create_portfolio(self, strategy_data, available_tickers) -> dict:
-        # If self.train_interval is true, then train the model
-        if self.train_interval:
-            train_x, train_y = self._prepare_data(strategy_data)
-            self.reg.fit(train_x, train_y)
-            self.train_interval = False
+    def _fit(self, train_x, train_y):
+        self.reg.fit(train_x, train_y)
+
+    def _get_model(self):
+        return self.reg
+
+    def _set_model(self, model):
+        self.reg = model
 
+    def _get_train_config(self):
+        # The fields which change only the portfolio or the retraining schedule are not included
+        return get_cfg_fields(LogRegCFG, ignore=['weighting', 'retrain_every',
+                                                 'retrain_calendar', 'retrain_drift'])
+
+    def create_portfolio(self, strategy_data, available_tickers) -> dict:
         # Perform the formation of the portfolio
         latest_date = max(strategy_data['date'].unique())
         latest_data = strategy_data[( strategy_data['date'] == latest_date ) &
-                                    ( strategy_data['ticker'].isin(available_tickers) )].dropna()
+                                    ( strategy_data['ticker'].isin(available_tickers) )].dropna(
+                                        subset=self.columns_x + ['price'])
+
+        # If self.train_interval is true, then train the model
+        if self.update_train_interval(latest_date, latest_data[self.columns_x]):
+            with self.profiler.phase('fit'):
+                train_x, train_y = self._prepare_data(strategy_data)
+                self.fit_model(train_x, train_y, sorted(strategy_data['date'].unique()))
+            self.mark_trained(latest_date)
 
         pred_x = latest_data[self.columns_x]
 
@@ -110,31 +115,9 @@ class LogitRatios(BaseStrategy):
         pred_tickers = latest_data['ticker']
 
         preds = self.reg.predict(pred_x)
-        preds = pd.DataFrame(preds, index=pred_tickers, columns=['prediction'])
-
-        # Write correct prediction specification
-        if self.decision_rule == 'median':
-            long_bin = 1
-            short_bin = 0
-
-        elif self.decision_rule == 'quartile':
-            long_bin = 3
-            short_bin = 0
-
-        elif self.decision_rule == 'octile':
-            long_bin = 7
-            short_bin = 0
-
-        preds['prediction'] = [1 if x==long_bin else -1 if x==short_bin else 0 for x in preds['prediction']]
-
-        # Count the values of long and short
-        number_long = preds[preds['prediction'] == 1]['prediction'].shape[0]
-        number_short = preds[preds['prediction'] == -1]['prediction'].shape[0]
-
-        if number_long > 0:
-            preds.loc[preds['prediction'] == 1, 'prediction'] = 1 / number_long
-
-        if number_short > 0:
-            preds.loc[preds['prediction'] == -1, 'prediction'] = -1 / number_short
+        # Expected bin of each ticker orders the tickers within the legs
+        expected_bins = self.reg.predict_proba(pred_x) @ self.reg.classes_ \
+            if LogRegCFG.weighting == 'rank' else None
+        weights = bin_weights(preds, self.decision_rule, expected_bins, LogRegCFG.weighting)
 
-        return preds.to_dict()['prediction']
+        return self.to_weights(pred_tickers, weights)
@@ -0,0 +1,110 @@
+import os
+import json
+import hashlib
+
+import pandas as pd
+import joblib
+
+
+MODEL_CACHE_PATH = 'src/strategies/trained_models'
+
+
+class ModelCache():
+    def __init__(self, cache_dir=MODEL_CACHE_PATH, max_size=2**30):
+        """
+        ModelCache keeps the fitted models on disk, so that repeated runs
+        (e.g. sweeps over decision rules or maximum allocations) reuse a model
+        fitted on the same data with the same configuration instead of refitting it
+
+        A model is stored in cache_dir/{key}.joblib, where the key is the hash of the
+        strategy, the config fields which change the fit, the training dates and the
+        training data itself (so a new version of the data gives a new key), see get_key
+
+        max_size : maximum size of cache_dir in bytes, once it is exceeded the least
+        recently used models are deleted
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def get_key(strategy, config, train_dates, train_x, train_y, previous_key=None):
+        """
+        Returns the hash of the model fitted by strategy (name) with config (dictionary
+        of the config fields) on train_x, train_y of the train_dates
+
+        previous_key : key of the model the fit starts from (warm start), if any
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps([strategy, config, [str(d) for d in train_dates], previous_key],
+                                 sort_keys=True, default=str).encode())
+        for values in [train_x, train_y]:
+            digest.update(pd.util.hash_pandas_object(pd.DataFrame(values), index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    def _get_path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.joblib')
+
+    def load(self, key):
+        """
+        Returns the model of the key or None if it is not in the cache
+        """
+        file_path = self._get_path(key)
+        try:
+            model = joblib.load(file_path)
+        except (FileNotFoundError, EOFError):
+            return None
+        # The modification time marks the last use of the model
+        os.utime(file_path)
+        return model
+
+    def save(self, key, model):
+        # Write to a temporary file first, so that concurrent readers never see a half written model
+        file_path = self._get_path(key)
+        tmp_path = f'{file_path}.{os.getpid()}.tmp'
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, file_path)
+        self.evict()
+
+    def get_size(self):
+        return sum(size for _, _, size in self._list_models())
+
+    def _list_models(self):
+        models = []
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith('.joblib'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, file_name))
+            except FileNotFoundError:
+                continue
+            models.append((stat.st_mtime, file_name, stat.st_size))
+        return models
+
+    def evict(self):
+        """
+        Deletes the least recently used models until the cache fits into max_size
+        """
+        models = sorted(self._list_models())
+        total_size = sum(size for _, _, size in models)
+        for _, file_name, size in models:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, file_name))
+            except FileNotFoundError:
+                # Already evicted by another process
+                pass
+            total_size -= size
+
+    def clear(self):
+        for _, file_name, _ in self._list_models():
+            os.remove(os.path.join(self.cache_dir, file_name))
+
+
+def get_cfg_fields(cfg, ignore=()):
+    """
+    Returns the dictionary of the fields of the config class except ignore
+    """
+    return {name : value for name, value in vars(cfg).items()
+            if not name.startswith('__') and name not in ignore}
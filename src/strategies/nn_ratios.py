@@ -1,8 +1,13 @@
+import math
+
 import numpy as np
 import pandas as pd
 
 from src.strategies.base_strategy import BaseStrategy
 from src.strategies.cfg import NNCFG
+from src.strategies.model_cache import get_cfg_fields
+from src.strategies.features import prepare_returns, label_returns, RATIO_COLUMNS, N_TILES
+from src.strategies.decision_rules import long_short_weights, bin_weights
 
 from pytorch_lightning import LightningDataModule, LightningModule, Trainer, seed_everything
 from pytorch_lightning.loggers import CSVLogger
@@ -24,17 +29,18 @@ class NNRatiosModel(LightningModule):
         super().__init__()
         self.layer_1 = nn.Linear(input_shape, hidden_shape)
         self.activation = nn.Tanh()
+        self.layer_2 = nn.Linear(hidden_shape, self.set_loss())
+
+    def set_loss(self):
+        """
+        Sets the loss of NNCFG.type_model and returns the number of outputs of the model
+        """
         if NNCFG.type_model == 'regression':
-            self.layer_2 = nn.Linear(hidden_shape, 1)
             self.loss = nn.MSELoss()
+            return 1
         elif NNCFG.type_model == 'classification':
             self.loss = nn.CrossEntropyLoss()
-            if NNCFG.decision_rule == 'median':
-                self.layer_2 = nn.Linear(hidden_shape, 2)
-            elif NNCFG.decision_rule == 'quartile':
-                self.layer_2 = nn.Linear(hidden_shape, 4)
-            elif NNCFG.decision_rule == 'octile':
-                self.layer_2 = nn.Linear(hidden_shape, 8)
+            return N_TILES[NNCFG.decision_rule]
 
     def forward(self, x):
         x = self.layer_1(x)
@@ -46,12 +52,17 @@ class NNRatiosModel(LightningModule):
         optimizer = torch.optim.SGD(self.parameters(), lr=NNCFG.learning_rate, momentum=NNCFG.momentum)
         return optimizer
 
+    def compute_loss(self, x, y):
+        """
+        Training loss of the batch
+        """
+        return self.loss(self(x), y)
+
     def training_step(self, batch, batch_idx):
         x, y = batch
         if NNCFG.type_model == 'classification':
             y = y.squeeze()
-        out = self(x)
-        train_loss = self.loss(out, y)
+        train_loss = self.compute_loss(x, y)
         if NNCFG.log_loss:
             self.log("train_loss", train_loss)
         return train_loss
@@ -66,6 +77,70 @@ class NNRatiosModel(LightningModule):
             self.log("val_loss", val_loss)
 
 
+def init_linear(in_features, out_features, generator):
+    """
+    Returns the weight and the bias of nn.Linear(in_features, out_features)
+    initialised as nn.Linear.reset_parameters, with the draws of generator
+    """
+    # The bound of kaiming_uniform_ with a=sqrt(5) is also 1 / sqrt(in_features)
+    bound = 1 / math.sqrt(in_features)
+    weight = torch.empty(out_features, in_features).uniform_(-bound, bound, generator=generator)
+    bias = torch.empty(out_features).uniform_(-bound, bound, generator=generator)
+    return weight, bias
+
+
+class EnsembleNNRatiosModel(NNRatiosModel):
+    def __init__(self, input_shape, ensemble_size=NNCFG.ensemble_size,
+                 hidden_shape=NNCFG.hidden_shape):
+        """
+        Ensemble of ensemble_size NNRatiosModel trained concurrently as one batched model
+
+        The weights of the members are stacked into (members x inputs x outputs) tensors,
+        so the forward pass of all members is two batched matrix multiplications.
+        Member k is initialised as NNRatiosModel with the seed NNCFG.ensemble_seed + k.
+        The training loss is the sum of the losses of the members (so each member is
+        trained on its own loss), the prediction is the average of the members
+        (for classification the log of the averaged probabilities)
+        """
+        # The layers of NNRatiosModel are not built, so the global torch seed is not used
+        LightningModule.__init__(self)
+        self.activation = nn.Tanh()
+        number_outputs = self.set_loss()
+        self.ensemble_size = ensemble_size
+
+        members = []
+        for k in range(ensemble_size):
+            # A local generator for every member
+            generator = torch.Generator().manual_seed(NNCFG.ensemble_seed + k)
+            members.append(init_linear(input_shape, hidden_shape, generator) +
+                           init_linear(hidden_shape, number_outputs, generator))
+        weights_1, biases_1, weights_2, biases_2 = zip(*members)
+
+        self.weight_1 = nn.Parameter(torch.stack([weight.T for weight in weights_1]))
+        self.bias_1 = nn.Parameter(torch.stack(biases_1).unsqueeze(1))
+        self.weight_2 = nn.Parameter(torch.stack([weight.T for weight in weights_2]))
+        self.bias_2 = nn.Parameter(torch.stack(biases_2).unsqueeze(1))
+
+    def forward_members(self, x):
+        """
+        Returns the outputs of all members (members x batch x outputs)
+        """
+        x = torch.baddbmm(self.bias_1, x.expand(self.ensemble_size, -1, -1), self.weight_1)
+        x = self.activation(x)
+        return torch.baddbmm(self.bias_2, x, self.weight_2)
+
+    def forward(self, x):
+        out = self.forward_members(x)
+        if NNCFG.type_model == 'classification':
+            return out.softmax(dim=2).mean(dim=0).log()
+        return out.mean(dim=0)
+
+    def compute_loss(self, x, y):
+        out = self.forward_members(x)
+        # Mean over all members and rows times the number of members is the sum of member losses
+        return self.loss(out.flatten(0, 1), torch.cat([y] * self.ensemble_size)) * self.ensemble_size
+
+
 class DataModule(LightningDataModule):
     def __init__(self, data_x, data_y):
         super().__init__()
@@ -91,7 +166,39 @@ class DataModule(LightningDataModule):
         return DataLoader(dataset, batch_size=NNCFG.batch_size)
 
 
+def train_lean(model, dm):
+    """
+    Trains the model on the data of dm (DataModule below) with a plain torch loop
+    over large batches (NNCFG.lean_batch_size, the full batch if None), without the
+    Lightning trainer, logger, checkpoints and DataLoader. Returns the validation loss
+    """
+    y_tr, y_val = dm.y_tr, dm.y_val
+    if NNCFG.type_model == 'classification':
+        y_tr, y_val = y_tr.view(-1), y_val.view(-1)
+
+    batch_size = len(dm.x_tr) if NNCFG.lean_batch_size is None else NNCFG.lean_batch_size
+    optimizer = model.configure_optimizers()
+
+    model.train()
+    for epoch in range(NNCFG.epochs):
+        permutation = torch.randperm(len(dm.x_tr))
+        for start in range(0, len(dm.x_tr), batch_size):
+            idx = permutation[start:start + batch_size]
+            optimizer.zero_grad()
+            loss = model.compute_loss(dm.x_tr[idx], y_tr[idx])
+            loss.backward()
+            optimizer.step()
+
+    model.eval()
+    with torch.no_grad():
+        val_loss = model.loss(model(dm.x_val), y_val)
+    return val_loss.item()
+
+
 class NNRatios(BaseStrategy):
+    # Columns of the data used by the strategy
+    required_columns = ['price'] + RATIO_COLUMNS
+
     def __init__(self):
         """
         NNRatios implements the trading strategy using the Neural Network
@@ -111,9 +218,10 @@ class NNRatios(BaseStrategy):
         'octile' <- the same strategy as for 'quartile' but using
         the octiles for decision rules
 
-        train_interval : specifies the intervals when the linear
-        regression must be trained before being evaluated, otherwise
-        the pretrained regression is used
+        train_interval : specifies the intervals when the model must be
+        trained before being evaluated, otherwise the pretrained model is used.
+        The intervals are set by the retraining schedule in the config
+        (see BaseStrategy), by default the model is trained only once
 
         column_y : name of the prediction column
         columns_x : names of the data columns
@@ -121,24 +229,35 @@ class NNRatios(BaseStrategy):
         Comment on data preprocessing: it is all scaled by StandardScaler
         before training and inference
         """
-        super().__init__(required_number_dates=NNCFG.required_number_dates)
+        super().__init__(required_number_dates=NNCFG.required_number_dates,
+                         retrain_every=NNCFG.retrain_every,
+                         retrain_calendar=NNCFG.retrain_calendar,
+                         retrain_drift=NNCFG.retrain_drift)
 
         self.decision_rule = NNCFG.decision_rule
         assert self.decision_rule in ['median', 'quartile', 'octile'], ('Warning,'
                                          'Decision rule is specified incorrectly!')
 
-        self.train_interval = True
-
         if NNCFG.type_model == 'regression':
             self.column_y = 'return'
         elif NNCFG.type_model == 'classification':
             self.column_y = 'ranking'
 
-        self.columns_x = ['outstanding_share', 'turnover', 'pe', 'pe_ttm', 'pb',
-                          'ps', 'ps_ttm', 'dv_ratio', 'dv_ttm', 'total_mv', 'qfq_factor']
+        self.columns_x = list(RATIO_COLUMNS)
+
+        assert NNCFG.engine in ['lightning', 'lean'], 'Warning, engine is chosen incorrectly!'
+        assert NNCFG.compile_inference in [None, 'script', 'compile'], ('Warning, '
+                                        'compile_inference is chosen incorrectly!')
+        if NNCFG.num_threads is not None:
+            torch.set_num_threads(NNCFG.num_threads)
+
+        self.model = self._build_model()
+        self.predictor = self.model
 
-        self.model = NNRatiosModel(input_shape=len(self.columns_x))
+        if NNCFG.engine == 'lightning':
+            self.trainer = self._build_trainer()
 
+    def _build_trainer(self):
         self.csv_logger = CSVLogger("./nn_logs", name=repr(self.model))
 
         self.checkpoint_callback = ModelCheckpoint(monitor='val_loss',
@@ -146,45 +265,85 @@ class NNRatios(BaseStrategy):
                                                    dirpath='./pretrained_models/',
                                                    filename=repr(self.model))
 
-        self.trainer = Trainer(logger=self.csv_logger,
-                               log_every_n_steps=NNCFG.log_frequency,
-                               max_epochs=NNCFG.epochs,
-                               val_check_interval=NNCFG.val_check_interval,
-                               callbacks=self.checkpoint_callback,
-                               fast_dev_run=False)
+        return Trainer(logger=self.csv_logger,
+                       log_every_n_steps=NNCFG.log_frequency,
+                       max_epochs=NNCFG.epochs,
+                       val_check_interval=NNCFG.val_check_interval,
+                       callbacks=self.checkpoint_callback,
+                       fast_dev_run=False)
+
+    def _build_model(self):
+        if NNCFG.ensemble_size > 1:
+            return EnsembleNNRatiosModel(input_shape=len(self.columns_x), ensemble_size=NNCFG.ensemble_size)
+        return NNRatiosModel(input_shape=len(self.columns_x))
+
+    def _fit(self, train_x, train_y):
+        """
+        Trains self.model with the engine of NNCFG and prepares the predictor
+        """
+        dm = DataModule(train_x, train_y)
+        if self.last_training_date is not None:
+            # Retraining continues from the current weights if NNCFG.warm_start
+            if not NNCFG.warm_start:
+                self.model = self._build_model()
+            # A new trainer is needed as the fitted one has reached max_epochs
+            if NNCFG.engine == 'lightning':
+                self.trainer = self._build_trainer()
+
+        if NNCFG.engine == 'lightning':
+            self.trainer.fit(model=self.model,datamodule=dm)
+        else:
+            train_lean(self.model, dm)
+
+        self.predictor = self._build_predictor()
+
+    def _get_model(self):
+        return self.model.state_dict()
+
+    def _set_model(self, model):
+        self.model.load_state_dict(model)
+        self.predictor = self._build_predictor()
+
+    def _get_train_config(self):
+        # The fields which change only the portfolio, the retraining schedule,
+        # the logging or the inference are not included
+        ignore = ['weighting', 'retrain_every', 'retrain_calendar', 'retrain_drift',
+                  'log_loss', 'log_frequency', 'num_threads', 'compile_inference']
+        if NNCFG.type_model == 'regression':
+            ignore.append('decision_rule')
+        return get_cfg_fields(NNCFG, ignore=ignore)
+
+    def _build_predictor(self):
+        """
+        Returns the compiled model for inference if NNCFG.compile_inference is set
+        """
+        self.model.eval()
+        if NNCFG.compile_inference == 'script':
+            return self.model.to_torchscript(method='trace',
+                                             example_inputs=torch.zeros(1, len(self.columns_x)))
+        elif NNCFG.compile_inference == 'compile':
+            if hasattr(torch, 'compile'):
+                return torch.compile(self.model)
+            print('torch.compile requires torch >= 2.0, the model is not compiled')
+        return self.model
 
     def __repr__(self):
-        return '_'.join(['NN', NNCFG.type_model, str(NNCFG.hidden_shape), NNCFG.decision_rule])
+        name = ['NN', NNCFG.type_model, str(NNCFG.hidden_shape), NNCFG.decision_rule]
+        if NNCFG.weighting != 'equal':
+            name.append(NNCFG.weighting)
+        if NNCFG.ensemble_size > 1:
+            name.append(f'ensemble{NNCFG.ensemble_size}')
+        return '_'.join(name)
 
     def _prepare_data(self, strategy_data):
-        new_df = pd.DataFrame(columns=strategy_data.columns)
-        for ticker in strategy_data['ticker'].unique():
-            current_df = strategy_data[strategy_data['ticker'] == ticker]
-            current_df = current_df.sort_values(by=['date'])
-            current_df['next_price'] = current_df['price'].diff().shift(-1)
-            current_df['return'] = current_df.apply(lambda x: x['next_price'] / x['price'] - 1, axis=1)
-            current_df = current_df.fillna(0)
-            new_df = pd.concat([new_df, current_df])
+        new_df = prepare_returns(strategy_data, fill_na=True, feature_store=self.feature_store)
 
         if NNCFG.type_model == 'classification':
             # Put returns in bins
-            min_return = new_df['return'].min()
-            if self.decision_rule == 'median':
-                bins = [min_return, np.median(new_df['return'])]
-            elif self.decision_rule == 'quartile':
-                bins = [min_return]
-                for idx in np.linspace(0.25,.75, 3):
-                    bins.append(np.quantile(new_df['return'], idx))
-            elif self.decision_rule == 'octile':
-                bins = [min_return]
-                for idx in np.linspace(0.125,.875, 7):
-                    bins.append(np.quantile(new_df['return'], idx))
-
-            new_df['ranking'] = np.digitize(new_df['return'], bins)
-            new_df['ranking'] -= 1
+            new_df = label_returns(new_df, self.decision_rule, self._get_label_store(NNCFG.labels))
 
         train_y = new_df[self.column_y]
-        train_x = new_df[self.columns_x]
+        train_x = new_df[self.columns_x].astype(np.float64)
 
         # Normalise data
         self.scaler = StandardScaler()
@@ -194,17 +353,18 @@ class NNRatios(BaseStrategy):
 
 
     def create_portfolio(self, strategy_data, available_tickers) -> dict:
-        # If self.train_interval is true, then train the model
-        if self.train_interval:
-            train_x, train_y = self._prepare_data(strategy_data)
-            dm = DataModule(train_x, train_y)
-            self.trainer.fit(model=self.model,datamodule=dm)
-            self.train_interval = False
-
         # Perform the formation of the portfolio
         latest_date = max(strategy_data['date'].unique())
         latest_data = strategy_data[( strategy_data['date'] == latest_date ) &
-                                    ( strategy_data['ticker'].isin(available_tickers) )].dropna()
+                                    ( strategy_data['ticker'].isin(available_tickers) )].dropna(
+                                        subset=self.columns_x + ['price'])
+
+        # If self.train_interval is true, then train the model
+        if self.update_train_interval(latest_date, latest_data[self.columns_x]):
+            with self.profiler.phase('fit'):
+                train_x, train_y = self._prepare_data(strategy_data)
+                self.fit_model(train_x, train_y, sorted(strategy_data['date'].unique()))
+            self.mark_trained(latest_date)
 
         pred_x = latest_data[self.columns_x]
         # Normalise the input data
@@ -213,52 +373,17 @@ class NNRatios(BaseStrategy):
         pred_x = torch.Tensor(pred_x.to_numpy())
         pred_tickers = latest_data['ticker']
 
-        preds = self.model(pred_x)
-        if NNCFG.type_model == 'classification':
-            preds = preds.softmax(dim=1)
-            preds = torch.argmax(preds, dim=1)
-        preds = preds.detach().numpy()
-        preds = pd.DataFrame(preds, index=pred_tickers, columns=['prediction'])
-
+        with torch.no_grad():
+            preds = self.predictor(pred_x)
 
         if NNCFG.type_model == 'regression':
-            if self.decision_rule == 'median':
-                upper_cutoff = np.median(preds)
-                lower_cutoff = np.median(preds)
-
-            elif self.decision_rule == 'quartile':
-                upper_cutoff = np.quantile(preds, .75)
-                lower_cutoff = np.quantile(preds, .25)
-
-            elif self.decision_rule == 'octile':
-                upper_cutoff = np.quantile(preds, .875)
-                lower_cutoff = np.quantile(preds, .125)
-
-            preds['prediction'] = [1 if x>upper_cutoff else -1 if x<lower_cutoff else 0 for x in preds['prediction']]
+            weights = long_short_weights(preds.numpy(), self.decision_rule, NNCFG.weighting)
         elif NNCFG.type_model == 'classification':
-            if self.decision_rule == 'median':
-                long_bin = 1
-                short_bin = 0
-
-            elif self.decision_rule == 'quartile':
-                long_bin = 3
-                short_bin = 0
-
-            elif self.decision_rule == 'octile':
-                long_bin = 7
-                short_bin = 0
-
-
-            preds['prediction'] = [1 if x==long_bin else -1 if x==short_bin else 0 for x in preds['prediction']]
-
-        # Count the values of long and short
-        number_long = preds[preds['prediction'] == 1]['prediction'].shape[0]
-        number_short = preds[preds['prediction'] == -1]['prediction'].shape[0]
-
-        if number_long > 0:
-            preds.loc[preds['prediction'] == 1, 'prediction'] = 1 / number_long
-
-        if number_short > 0:
-            preds.loc[preds['prediction'] == -1, 'prediction'] = -1 / number_short
-
-        return preds.to_dict()['prediction']
+            probabilities = preds.softmax(dim=1)
+            # Expected bin of each ticker orders the tickers within the legs
+            expected_bins = (probabilities @ torch.arange(probabilities.shape[1],
+                                                          dtype=probabilities.dtype)).numpy()
+            weights = bin_weights(torch.argmax(probabilities, dim=1).numpy(), self.decision_rule,
+                                  expected_bins, NNCFG.weighting)
+
+        return self.to_weights(pred_tickers, weights)
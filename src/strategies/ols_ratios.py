@@ -5,10 +5,16 @@ from sklearn.linear_model import LinearRegression
 
 from src.strategies.base_strategy import BaseStrategy
 from src.strategies.cfg import OLSCFG
+from src.strategies.model_cache import get_cfg_fields
+from src.strategies.features import prepare_returns, RATIO_COLUMNS
+from src.strategies.decision_rules import long_short_weights
 
 from sklearn.preprocessing import StandardScaler
 
 class OLSRatios(BaseStrategy):
+    # Columns of the data used by the strategy
+    required_columns = ['price'] + RATIO_COLUMNS
+
     def __init__(self):
         """
         OLSRatios implements the trading strategy using the regression as
@@ -28,42 +34,39 @@ class OLSRatios(BaseStrategy):
         'octile' <- the same strategy as for 'quartile' but using
         the octiles for decision rules
 
-        train_interval : specifies the intervals when the linear
-        regression must be trained before being evaluated, otherwise
-        the pretrained regression is used
+        train_interval : specifies the intervals when the model must be
+        trained before being evaluated, otherwise the pretrained model is used.
+        The intervals are set by the retraining schedule in the config
+        (see BaseStrategy), by default the model is trained only once
 
         Comment on data preprocessing: it is all scaled by StandardScaler
         before training and inference
         """
-        super().__init__(required_number_dates=OLSCFG.required_number_dates)
+        super().__init__(required_number_dates=OLSCFG.required_number_dates,
+                         retrain_every=OLSCFG.retrain_every,
+                         retrain_calendar=OLSCFG.retrain_calendar,
+                         retrain_drift=OLSCFG.retrain_drift)
 
         self.decision_rule = OLSCFG.decision_rule
         assert self.decision_rule in ['median', 'quartile', 'octile'], ('Warning,'
                                          'Decision rule is specified incorrectly!')
         self.reg = LinearRegression()
 
-        self.train_interval = True
-
         self.column_y = 'return'
-        self.columns_x = ['outstanding_share', 'turnover', 'pe', 'pe_ttm', 'pb',
-                          'ps', 'ps_ttm', 'dv_ratio', 'dv_ttm', 'total_mv', 'qfq_factor']
+        self.columns_x = list(RATIO_COLUMNS)
 
     def __repr__(self):
-        return '_'.join(['OLS', OLSCFG.decision_rule])
+        name = ['OLS', OLSCFG.decision_rule]
+        if OLSCFG.weighting != 'equal':
+            name.append(OLSCFG.weighting)
+        return '_'.join(name)
 
 
     def _prepare_data(self, strategy_data):
-        new_df = pd.DataFrame(columns=strategy_data.columns)
-        for ticker in strategy_data['ticker'].unique():
-            current_df = strategy_data[strategy_data['ticker'] == ticker]
-            current_df = current_df.sort_values(by=['date'])
-            current_df['next_price'] = current_df['price'].diff().shift(-1)
-            current_df['return'] = current_df.apply(lambda x: x['next_price'] / x['price'] - 1, axis=1)
-            current_df = current_df.dropna()
-            new_df = pd.concat([new_df, current_df])
+        new_df = prepare_returns(strategy_data, feature_store=self.feature_store, columns=self.columns_x)
 
         train_y = new_df[self.column_y]
-        train_x = new_df[self.columns_x]
+        train_x = new_df[self.columns_x].astype(np.float64)
 
         # Normalise data
         self.scaler = StandardScaler()
@@ -72,17 +75,33 @@ class OLSRatios(BaseStrategy):
         return train_x, train_y
 
 
-    def create_portfolio(self, strategy_data, available_tickers) -> dict:
-        # If self.train_interval is true, then train the model
-        if self.train_interval:
-            train_x, train_y = self._prepare_data(strategy_data)
-            self.reg.fit(train_x, train_y)
-            self.train_interval = False
+    def _fit(self, train_x, train_y):
+        self.reg.fit(train_x, train_y)
 
+    def _get_model(self):
+        return self.reg
+
+    def _set_model(self, model):
+        self.reg = model
+
+    def _get_train_config(self):
+        # The fields which change only the portfolio or the retraining schedule are not included
+        return get_cfg_fields(OLSCFG, ignore=['decision_rule', 'weighting', 'retrain_every',
+                                              'retrain_calendar', 'retrain_drift'])
+
+    def create_portfolio(self, strategy_data, available_tickers) -> dict:
         # Perform the formation of the portfolio
         latest_date = max(strategy_data['date'].unique())
         latest_data = strategy_data[( strategy_data['date'] == latest_date ) &
-                                    ( strategy_data['ticker'].isin(available_tickers) )].dropna()
+                                    ( strategy_data['ticker'].isin(available_tickers) )].dropna(
+                                        subset=self.columns_x + ['price'])
+
+        # If self.train_interval is true, then train the model
+        if self.update_train_interval(latest_date, latest_data[self.columns_x]):
+            with self.profiler.phase('fit'):
+                train_x, train_y = self._prepare_data(strategy_data)
+                self.fit_model(train_x, train_y, sorted(strategy_data['date'].unique()))
+            self.mark_trained(latest_date)
 
         pred_x = latest_data[self.columns_x]
         # Normalise the input data
@@ -91,27 +110,6 @@ class OLSRatios(BaseStrategy):
         pred_tickers = latest_data['ticker']
 
         preds = self.reg.predict(pred_x)
-        preds = pd.DataFrame(preds, index=pred_tickers, columns=['prediction'])
-
-        if self.decision_rule == 'median':
-            upper_cutoff = np.median(preds)
-            lower_cutoff = np.median(preds)
-
-        elif self.decision_rule == 'quartile':
-            upper_cutoff = np.quantile(preds, .75)
-            lower_cutoff = np.quantile(preds, .25)
-
-        elif self.decision_rule == 'octile':
-            upper_cutoff = np.quantile(preds, .875)
-            lower_cutoff = np.quantile(preds, .125)
-
-        preds['prediction'] = [1 if x>upper_cutoff else -1 if x<lower_cutoff else 0 for x in preds['prediction']]
-
-        # Count the values of long and short
-        number_long = preds[preds['prediction'] == 1]['prediction'].shape[0]
-        number_short = preds[preds['prediction'] == -1]['prediction'].shape[0]
-
-        preds.loc[preds['prediction'] == 1, 'prediction'] = 1 / number_long
-        preds.loc[preds['prediction'] == -1, 'prediction'] = -1 / number_short
+        weights = long_short_weights(preds, self.decision_rule, OLSCFG.weighting)
 
-        return preds.to_dict()['prediction']
+        return self.to_weights(pred_tickers, weights)
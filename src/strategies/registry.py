@@ -0,0 +1,74 @@
+from importlib import import_module
+
+from src.strategies import cfg
+
+
+# Strategies are resolved lazily by name, so that only the chosen strategy
+# and its dependencies are imported (e.g. torch and pytorch_lightning for NNRatios)
+# name : (module, class name, config name)
+STRATEGY_REGISTRY = {
+    'OLSRatios' : ('src.strategies.ols_ratios', 'OLSRatios', 'OLSCFG'),
+    'LogitRatios' : ('src.strategies.logit_ratios', 'LogitRatios', 'LogRegCFG'),
+    'NNRatios' : ('src.strategies.nn_ratios', 'NNRatios', 'NNCFG'),
+}
+
+STRATEGIES = list(STRATEGY_REGISTRY.keys())
+
+
+def register_strategy(name, module, class_name, cfg_name=None):
+    """
+    Adds a strategy to the registry, cfg_name is the name of
+    its config class in src/strategies/cfg.py (if any)
+    """
+    STRATEGY_REGISTRY[name] = (module, class_name, cfg_name)
+    if name not in STRATEGIES:
+        STRATEGIES.append(name)
+
+
+def get_strategy_class(name):
+    """
+    Imports the module of the strategy and returns its class
+    """
+    assert name in STRATEGY_REGISTRY, f'Warning, strategy {name} is not available!'
+    module, class_name, _ = STRATEGY_REGISTRY[name]
+    return getattr(import_module(module), class_name)
+
+
+def get_strategy_cfg(name):
+    assert name in STRATEGY_REGISTRY, f'Warning, strategy {name} is not available!'
+    _, _, cfg_name = STRATEGY_REGISTRY[name]
+    return getattr(cfg, cfg_name) if cfg_name is not None else None
+
+
+def get_required_columns(strategies):
+    """
+    Returns the union of the columns required by the strategies,
+    None if one of them uses all columns
+    """
+    columns = []
+    for name in strategies:
+        strategy_columns = get_strategy_class(name).required_columns
+        if strategy_columns is None:
+            return None
+        columns += [column for column in strategy_columns if column not in columns]
+    return columns
+
+
+def build_strategy(strategy, decision_rule, type_model='regression', **params):
+    """
+    Sets the parameters of the strategy in its config and returns
+    the strategy, type_model is only used by NNRatios
+
+    params : other fields of the config to be set, e.g. retrain_every=12
+    """
+    strategy_cfg = get_strategy_cfg(strategy)
+
+    if strategy_cfg is not None:
+        strategy_cfg.decision_rule = decision_rule
+        if strategy == 'NNRatios':
+            strategy_cfg.type_model = type_model
+        for name, value in params.items():
+            assert hasattr(strategy_cfg, name), f'Warning, {strategy} has no parameter {name}!'
+            setattr(strategy_cfg, name, value)
+
+    return get_strategy_class(strategy)()
@@ -0,0 +1,261 @@
+"""
+Streaming ingestion of stock_data.csv into a store partitioned by year, and the
+datamodule which runs the simulator over the store without loading the whole dataset
+
+python -m src.streaming --data_dir data --chunksize 1000000   (builds the store)
+"""
+import os
+import json
+import shutil
+import argparse
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from src.datacache import DataCache, get_ticker_universe, select_columns, to_columnar
+from src.datamodule import select_schedule
+
+
+class PartitionedStore(DataCache):
+    """
+    PartitionedStore is the DataCache of the datasets which do not fit into memory
+
+    stock_data.csv is read in chunks of chunksize rows and every chunk is split
+    by year into spill files, so only one chunk is held in memory. Then every year
+    is converted separately (in date order) into the columnar layout of DataCache
+    and written into store_dir/{year}, so the memory needed to build the store is
+    the size of the largest year and not of the whole dataset
+
+    Besides the columns of the years the store keeps:
+    tickers.npy, listed_tickers.npy : as in DataCache, ticker codes are shared by all years
+    calendar.npy : int32 ordinals of all trading dates
+    date_rows.npy : (dates x 2) first and one past the last row of each date in its year
+    """
+    version = 1
+
+    def __init__(self, data_dir='data', store_dir=None, chunksize=1000000):
+        super().__init__(data_dir, store_dir if store_dir is not None else os.path.join(data_dir, 'store'))
+        self.chunksize = chunksize
+
+    def _spill(self, spill_dir):
+        """
+        Splits stock_data.csv by year into spill_dir/{year}.csv,
+        returns the years and all tickers of the data
+        """
+        years, data_tickers = set(), set()
+        for chunk in pd.read_csv(self.stock_file, chunksize=self.chunksize, dtype={'ticker' : str, 'date' : str}):
+            data_tickers.update(chunk['ticker'].unique())
+            for year, year_chunk in chunk.groupby(chunk['date'].str[:4]):
+                spill_file = os.path.join(spill_dir, f'{year}.csv')
+                year_chunk.to_csv(spill_file, mode='a', header=not os.path.exists(spill_file), index=False)
+                years.add(year)
+        return sorted(years), np.array(sorted(data_tickers), dtype=str)
+
+    def build(self):
+        """
+        Streams the csv files into the partitioned store
+        """
+        print(f'...Building partitioned store in {self.cache_dir}...')
+        fingerprint = self._fingerprint()
+        spill_dir = os.path.join(self.cache_dir, 'spill')
+        shutil.rmtree(spill_dir, ignore_errors=True)
+        os.makedirs(spill_dir)
+
+        ticker_info = pd.read_csv(self.ticker_file)
+        years, data_tickers = self._spill(spill_dir)
+        listed_tickers = ticker_info['ticker'].unique().astype(str)
+        tickers = get_ticker_universe(listed_tickers, data_tickers)
+
+        calendar, date_rows, rows, columns = [], [], {}, None
+        for year in years:
+            year_data = pd.read_csv(os.path.join(spill_dir, f'{year}.csv'), dtype={'ticker' : str, 'date' : str})
+            arrays, columns = to_columnar(year_data, ticker_info, tickers)
+            del year_data
+
+            os.makedirs(os.path.join(self.cache_dir, year), exist_ok=True)
+            for name in ['ticker', 'date_ordinal'] + columns:
+                self._save_array(os.path.join(year, name), arrays[name])
+
+            date_ordinals = arrays['date_ordinal']
+            starts = np.concatenate([[0], np.flatnonzero(np.diff(date_ordinals)) + 1])
+            calendar.append(date_ordinals[starts])
+            date_rows.append(np.stack([starts, np.append(starts[1:], len(date_ordinals))], axis=1))
+            rows[year] = int(len(date_ordinals))
+            print(f'{year} : {rows[year]} rows')
+
+        shutil.rmtree(spill_dir)
+        self._save_array('tickers', tickers)
+        self._save_array('listed_tickers', listed_tickers)
+        self._save_array('calendar', np.concatenate(calendar).astype(np.int32))
+        self._save_array('date_rows', np.concatenate(date_rows).astype(np.int64))
+
+        # Meta is written last, it marks the store as complete
+        meta = {'fingerprint' : fingerprint, 'columns' : columns, 'years' : years, 'rows' : rows}
+        tmp_path = self.meta_file + f'.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_file)
+
+    def load(self):
+        """
+        Returns the meta and the index (tickers, listed_tickers, calendar, date_rows)
+        of the store. Builds the store first if needed
+        """
+        if not self.is_valid():
+            self.build()
+        index = {name : np.load(os.path.join(self.cache_dir, f'{name}.npy'))
+                 for name in ['tickers', 'listed_tickers', 'calendar', 'date_rows']}
+        return self._read_meta(), index
+
+    def load_partition(self, year, columns):
+        """
+        Returns the memory-mapped columns of the year
+        """
+        return {name : self._load_array(os.path.join(year, name))
+                for name in ['ticker', 'date_ordinal'] + columns}
+
+
+class StreamingDataModule():
+    def __init__(self, data_dir='data', store_dir=None, chunksize=1000000, max_partitions=2, columns=None):
+        """
+        StreamingDataModule has the interface of DataModule used by Simulator.simulate
+        (get_schedule, get_tickers, get_date_block, get_diff_and_current_prices,
+        get_price_vectors), but it does not load the data into memory
+
+        Only the trading calendar and the tickers are loaded. The rows of a date are read
+        from the memory-mapped year of the PartitionedStore when the date is requested,
+        so the simulator holds just the trailing window and the current cross-section.
+        At most max_partitions years are kept open (a trailing window may span two years)
+
+        The store is built from the csv files on the first run (see PartitionedStore)
+
+        columns : feature columns to be read, as in DataModule (price is always read)
+        """
+        self.data_dir = data_dir
+        self.store = PartitionedStore(data_dir, store_dir, chunksize)
+        self.max_partitions = max_partitions
+
+        meta, index = self.store.load()
+        self.columns = select_columns(meta['columns'], None if columns is None else ['price'] + list(columns))
+        self.tickers = index['listed_tickers'].astype(object)
+        # All tickers indexed by their codes, as datamodule.panel.tickers
+        self.all_tickers = index['tickers'].astype(object)
+        self.ticker_index = {ticker : code for code, ticker in enumerate(self.all_tickers)}
+        self.ticker_dtype = pd.CategoricalDtype(self.all_tickers)
+
+        self.calendar = index['calendar']
+        self.date_rows = index['date_rows']
+        self.dates = np.array([date.fromordinal(int(x)).isoformat() for x in self.calendar], dtype=object)
+        self.date_position = {d : idx for idx, d in enumerate(self.dates)}
+
+        self._partitions = OrderedDict()
+        self._schedules = {}
+
+    def _get_partition(self, year):
+        if year in self._partitions:
+            self._partitions.move_to_end(year)
+        else:
+            self._partitions[year] = self.store.load_partition(year, self.columns)
+            if len(self._partitions) > self.max_partitions:
+                self._partitions.popitem(last=False)
+        return self._partitions[year]
+
+    def _get_block_arrays(self, date):
+        """
+        Returns the columns of the rows of the date read from its year, or None
+        """
+        position = self.date_position.get(date)
+        if position is None:
+            return None
+        start_row, end_row = self.date_rows[position]
+        partition = self._get_partition(date[:4])
+        return {name : np.array(array[start_row:end_row]) for name, array in partition.items()}
+
+    def get_schedule(self, frequency, start_date, end_date):
+        """
+        Returns the list of trading dates, see DataModule.get_schedule
+        """
+        key = (frequency, start_date, end_date)
+        if key not in self._schedules:
+            start = np.searchsorted(self.dates, start_date, side='left')
+            end = np.searchsorted(self.dates, end_date, side='right')
+            self._schedules[key] = select_schedule(self.dates[start:end], self.calendar[start:end], frequency)
+        return list(self._schedules[key])
+
+    def get_tickers(self, date):
+        arrays = self._get_block_arrays(date)
+        if arrays is None:
+            return np.array([], dtype=object)
+        return self.all_tickers[arrays['ticker']]
+
+    def get_date_block(self, date):
+        """
+        Returns all rows of the date as a data frame in the layout of DataModule.data
+        """
+        arrays = self._get_block_arrays(date)
+        if arrays is None:
+            arrays = {name : np.empty(0, dtype=np.int32 if name in ['ticker', 'date_ordinal'] else np.float32)
+                      for name in ['ticker', 'date_ordinal'] + self.columns}
+
+        data = {'ticker' : pd.Categorical.from_codes(arrays['ticker'], dtype=self.ticker_dtype),
+                'date' : np.full(len(arrays['ticker']), date, dtype=object),
+                'date_ordinal' : arrays['date_ordinal']}
+        for column in self.columns:
+            data[column] = arrays[column]
+        return pd.DataFrame(data)
+
+    def _get_prices(self, date):
+        """
+        Returns the prices of the date aligned with self.all_tickers (NaN if not available)
+        and the mask of the tickers which have a row at the date
+        """
+        prices = np.full(len(self.all_tickers), np.nan, dtype=np.float32)
+        present = np.zeros(len(self.all_tickers), dtype=bool)
+        arrays = self._get_block_arrays(date)
+        if arrays is not None:
+            prices[arrays['ticker']] = arrays['price']
+            present[arrays['ticker']] = True
+        return prices, present
+
+    def get_price_vectors(self, start_date, end_date):
+        """
+        Returns diff prices and prices at the start_date of all tickers as vectors
+        aligned with self.all_tickers (ticker codes), NaN if not available
+        """
+        prices_start, _ = self._get_prices(start_date)
+        prices_end, _ = self._get_prices(end_date)
+        return prices_end - prices_start, prices_start
+
+    def get_diff_and_current_prices(self, tickers, start_date, end_date):
+        """
+        Returns diff prices of the tickers over the date interval and prices
+        at the start_date as dictionaries, see DataModule.get_diff_and_current_prices
+        """
+        assert set(tickers).issubset(self.tickers), "Warning! Some tickers are not available."
+
+        tickers = np.asarray(tickers, dtype=object)
+        codes = np.array([self.ticker_index[ticker] for ticker in tickers], dtype=np.int64)
+        prices_start, present = self._get_prices(start_date)
+        prices_end, _ = self._get_prices(end_date)
+        prices_diff, prices_start = (prices_end - prices_start)[codes], prices_start[codes]
+
+        is_start = present[codes]
+        is_diff = is_start & ~np.isnan(prices_diff)
+        return (dict(zip(tickers[is_diff], prices_diff[is_diff])),
+                dict(zip(tickers[is_start], prices_start[is_start])))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data_dir', default='data', type=str)
+    parser.add_argument('--store_dir', default=None, type=str)
+    parser.add_argument('--chunksize', default=1000000, type=int, help='Number of csv rows read at once')
+    args = parser.parse_args()
+
+    store = PartitionedStore(args.data_dir, args.store_dir, args.chunksize)
+    if store.is_valid():
+        print(f'Store {store.cache_dir} is up to date')
+    else:
+        store.build()
@@ -0,0 +1,222 @@
+"""
+Runs a grid of simulations in parallel over a process pool
+
+The dataset is loaded once in the parent process. Workers are forked from it,
+so they share the loaded data (and the memory-mapped cache) instead of reloading it.
+Where fork is not available, each worker loads the data once from the cache.
+
+Example (the runs of report.sh):
+python -m src.sweep -s OLSRatios LogitRatios NNRatios -d median quartile octile \
+    -t regression classification -f monthly -r 2020-07-01:2022-05-11 --save_history
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from src.datamodule import DataModule
+from src.portfolio import Portfolio, ArrayPortfolio
+from src.simulator import Simulator, save_histories
+from src.history import HISTORY_PATH
+from src.metrics import compute_metrics, stack_curves
+from src.strategies.model_cache import ModelCache
+from src.strategies.registry import STRATEGIES, build_strategy, get_required_columns
+
+
+# Data shared by the runs of a worker process
+_DATAMODULE = None
+
+
+def expand_grid(strategies, decision_rules, type_models, frequencies, date_ranges):
+    """
+    Returns the list of runs of the grid, type_model is varied only for NNRatios
+    """
+    runs = []
+    for strategy, decision_rule, type_model, frequency, (start_date, end_date) in itertools.product(
+            strategies, decision_rules, type_models, frequencies, date_ranges):
+        if strategy != 'NNRatios':
+            if type_model != type_models[0]:
+                continue
+            type_model = None
+        runs.append({'strategy' : strategy, 'decision_rule' : decision_rule, 'type_model' : type_model,
+                     'frequency' : frequency, 'start_date' : start_date, 'end_date' : end_date})
+    return runs
+
+
+def _init_worker(data_dir, columns=None):
+    global _DATAMODULE
+    if _DATAMODULE is None:
+        _DATAMODULE = DataModule(data_dir=data_dir, columns=columns)
+
+
+def run_simulation(run, initial_value=100, max_allocation_long=100, max_allocation_short=100,
+                   risk_free_rate=.01, array_portfolio=False, vectorized=False, model_cache=False,
+                   proportional_cost=0., fixed_cost=0., slippage=0.):
+    """
+    Runs a single simulation of the grid on the shared data,
+    returns the history key and the history of the run
+
+    proportional_cost, fixed_cost, slippage : transaction costs of the portfolio (see src/portfolio.py)
+
+    model_cache : if True, the runs reuse the models fitted on the same data
+    (see src/strategies/model_cache.py)
+    """
+    if run['strategy'] == 'NNRatios':
+        # NNRatios draws from the global seeds (initialisation, validation split, shuffling),
+        # every run starts from the seeds of a new process (see seed_everything in nn_ratios.py),
+        # so the results do not depend on the number of workers and on the order of the runs
+        from pytorch_lightning.utilities.seed import seed_everything
+        seed_everything(0)
+
+    sr = build_strategy(run['strategy'], run['decision_rule'], run['type_model'])
+    if model_cache:
+        sr.model_cache = ModelCache()
+    if array_portfolio:
+        pf = ArrayPortfolio(_DATAMODULE.panel.tickers, initial_value=initial_value,
+                            max_allocation_long=max_allocation_long,
+                            max_allocation_short=max_allocation_short,
+                            proportional_cost=proportional_cost, fixed_cost=fixed_cost, slippage=slippage)
+    else:
+        pf = Portfolio(initial_value=initial_value,
+                       max_allocation_long=max_allocation_long,
+                       max_allocation_short=max_allocation_short,
+                       proportional_cost=proportional_cost, fixed_cost=fixed_cost, slippage=slippage)
+
+    sm = Simulator(_DATAMODULE, pf, sr, run['frequency'], run['start_date'], run['end_date'])
+    if vectorized:
+        sm.simulate_vectorized(verbose=False, progress_bar=False)
+    else:
+        sm.simulate(verbose=False, progress_bar=False)
+    sm.compute_metrics(risk_free_rate=risk_free_rate, verbose=False)
+
+    return sm.get_history_key(), sm.get_history()
+
+
+def score_histories(histories, risk_free_rate=.01):
+    """
+    Returns the dictionary {key : metrics} of the histories, all curves are
+    scored in one call (see src/metrics.py)
+    """
+    keys = list(histories.keys())
+    values = stack_curves([histories[key]['history_portfolio'] for key in keys])
+    metrics = compute_metrics(values, [histories[key]['frequency'] for key in keys], risk_free_rate)
+    return {key : {name : float(metric[idx]) for name, metric in metrics.items()}
+            for idx, key in enumerate(keys)}
+
+
+def print_scores(scores):
+    print(f'{"Run":>60} | {"Sharpe":>7} | {"Sortino":>7} | {"Max Drawdown":>12}')
+    print('-' * 96)
+    for key, metrics in sorted(scores.items(), key=lambda item: -item[1]['sharpe']):
+        print(f'{key:>60} | {metrics["sharpe"]:>7.2f} | {metrics["sortino"]:>7.2f} | '
+              f'{metrics["max_drawdown"]:>12.2%}')
+
+
+def sweep(runs, workers=None, data_dir='data', save_history=False, file_path=HISTORY_PATH, **kwargs):
+    """
+    Runs all the runs over a pool of workers (all cpus by default) and
+    returns the dictionary of histories {key : history}. If save_history is True,
+    the histories are added to the history file once all runs are finished
+
+    kwargs are passed to run_simulation
+    """
+    global _DATAMODULE
+    if len(runs) == 0:
+        print('No runs to simulate!')
+        return {}
+
+    workers = workers or os.cpu_count()
+    # Only the columns used by the strategies of the runs are loaded
+    columns = get_required_columns(sorted(set(run['strategy'] for run in runs)))
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        # Load once, the workers inherit the data from the parent
+        _init_worker(data_dir, columns)
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+
+    histories = {}
+    with ProcessPoolExecutor(max_workers=min(workers, len(runs)), mp_context=context,
+                             initializer=_init_worker, initargs=(data_dir, columns)) as executor:
+        futures = [executor.submit(run_simulation, run, **kwargs) for run in runs]
+        for run, future in zip(runs, futures):
+            key, history = future.result()
+            histories[key] = history
+            print(f'{key} | Sharpe: {history["sharpe"]:.2f} | '
+                  f'Return to Drawdown: {history["return_to_drawdown"]:.2f}')
+
+    print('...Annualized metrics of the runs...')
+    print_scores(score_histories(histories, kwargs.get('risk_free_rate', .01)))
+
+    if save_history:
+        save_histories(histories, file_path)
+        print(f'{len(histories)} runs are saved to {file_path}')
+
+    return histories
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-s','--strategies', default=STRATEGIES, nargs='+', choices=STRATEGIES,
+                        type=str, help='Choose strategies')
+
+    parser.add_argument('-d','--decision_rules', default=['median'], nargs='+',
+                        choices=['median', 'quartile', 'octile'], type=str, help='Choose trading decision rules')
+
+    parser.add_argument('-t','--type_models', default=['regression'], nargs='+',
+                        choices=['regression', 'classification'], type=str, help='Choose model types for NNModel')
+
+    parser.add_argument('-f','--frequencies', default=['yearly'], nargs='+',
+                        choices=['daily', 'weekly', 'monthly', 'yearly'], type=str, help='Choose frequencies')
+
+    parser.add_argument('-r','--date_ranges', default=['2005-01-04:2022-05-11'], nargs='+',
+                        type=str, help='Choose date ranges in the format start_date:end_date')
+
+    parser.add_argument('-w','--workers', default=None, type=int, help='Choose number of worker processes')
+
+    parser.add_argument('--data_dir', default='data', type=str, help='Choose data directory')
+
+    parser.add_argument('--initial_value', default=100, type=int, help='Choose initial value of portfolio')
+
+    parser.add_argument('-max_long','--max_allocation_long', default=100,
+                            type=int, help='Choose maximum allocation for long position')
+
+    parser.add_argument('-max_short','--max_allocation_short', default=100,
+                            type=int, help='Choose maximum allocation for short position')
+
+    parser.add_argument('-history', '--save_history', action='store_true')
+
+    parser.add_argument('-rf','--risk_free_rate', default=.01,
+                        type=float, help='Choose risk free rate')
+
+    parser.add_argument('-array', '--array_portfolio', action='store_true',
+                        help='Use the vectorized portfolio with positions stored as arrays')
+
+    parser.add_argument('-vec', '--vectorized', action='store_true',
+                        help='Collect all weights first and compute the portfolio history in one pass')
+
+    parser.add_argument('-cache', '--model_cache', action='store_true',
+                        help='Reuse the models fitted on the same data by the previous runs')
+
+    parser.add_argument('--cost', default=0., type=float,
+                        help='Proportional transaction cost as a share of the traded value')
+
+    parser.add_argument('--fixed_cost', default=0., type=float, help='Fixed cost of every traded ticker')
+
+    parser.add_argument('--slippage', default=0., type=float, help='Slippage as a share of the traded value')
+
+    args = parser.parse_args()
+
+    date_ranges = [tuple(date_range.split(':')) for date_range in args.date_ranges]
+    runs = expand_grid(args.strategies, args.decision_rules, args.type_models,
+                       args.frequencies, date_ranges)
+
+    print(f'...Running {len(runs)} simulations...')
+    sweep(runs, workers=args.workers, data_dir=args.data_dir, save_history=args.save_history,
+          initial_value=args.initial_value, max_allocation_long=args.max_allocation_long,
+          max_allocation_short=args.max_allocation_short, risk_free_rate=args.risk_free_rate,
+          array_portfolio=args.array_portfolio, vectorized=args.vectorized, model_cache=args.model_cache,
+          proportional_cost=args.cost, fixed_cost=args.fixed_cost, slippage=args.slippage)
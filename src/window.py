@@ -0,0 +1,81 @@
+from collections import deque
+
+import pandas as pd
+
+
+class TrailingWindow():
+    def __init__(self, datamodule, dates, number_previous_dates):
+        """
+        TrailingWindow keeps the trailing data of the simulator incrementally
+
+        It holds the blocks of rows of the last number_previous_dates dates
+        before the current date. When the current date moves forward by one,
+        only the block of the newest date is fetched and the oldest block is evicted,
+        so the cost of a step is proportional to one date's cross-section and not
+        to the whole dataset. If the dates of the window are consecutive trading
+        dates (e.g. a daily schedule), the window is a single slice of the data of
+        the datamodule without a copy (see DataModule.get_consecutive_block), only
+        the windows of schedules with gaps concatenate their blocks
+
+        dates : sorted dates of the simulator
+        number_previous_dates : number of dates in the window
+        """
+        self.datamodule = datamodule
+        self.dates = dates
+        self.number_previous_dates = number_previous_dates
+
+        # Blocks of rows of (date, data) in the window
+        self.blocks = deque()
+        # Index in dates of the current date, that is the first date after the window
+        self.index_current_date = 0
+        self._data = None
+
+    def reset(self, index_current_date):
+        self.blocks.clear()
+        self.index_current_date = max(index_current_date - self.number_previous_dates, 0)
+        self._data = None
+
+    def move_to(self, index_current_date):
+        """
+        Moves the window so that it contains the dates before dates[index_current_date]
+        """
+        # Going back or jumping further than the window requires a full refill
+        if (index_current_date < self.index_current_date) or \
+           (index_current_date - self.index_current_date > self.number_previous_dates):
+            self.reset(index_current_date)
+
+        while self.index_current_date < index_current_date:
+            date = self.dates[self.index_current_date]
+            self.blocks.append((date, self.datamodule.get_date_block(date)))
+            if len(self.blocks) > self.number_previous_dates:
+                self.blocks.popleft()
+            self.index_current_date += 1
+            self._data = None
+
+        return self.get_data()
+
+    def get_dates(self):
+        return [date for date, _ in self.blocks]
+
+    def get_data(self):
+        """
+        Returns the rows of all dates in the window, it is computed once per step
+        """
+        if self._data is None:
+            self._data = self._join()
+        return self._data
+
+    def _join(self):
+        # The streaming datamodule does not keep the rows of all dates in one frame
+        if hasattr(self.datamodule, 'get_consecutive_block'):
+            data = self.datamodule.get_consecutive_block(self.get_dates())
+            if data is not None:
+                return data
+
+        blocks = [block for _, block in self.blocks]
+        if len(blocks) == 0:
+            # The block of a date which is not a trading date is empty
+            return self.datamodule.get_date_block(None)
+        if len(blocks) == 1:
+            return blocks[0]
+        return pd.concat(blocks)
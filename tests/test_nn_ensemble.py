@@ -0,0 +1,36 @@
+import torch
+import torch.nn as nn
+
+from src.strategies.cfg import NNCFG
+from src.strategies.nn_ratios import EnsembleNNRatiosModel
+
+
+def test_members_with_the_same_seed_have_the_same_weights():
+    first = EnsembleNNRatiosModel(input_shape=11, ensemble_size=3)
+    second = EnsembleNNRatiosModel(input_shape=11, ensemble_size=2)
+
+    for name in ['weight_1', 'bias_1', 'weight_2', 'bias_2']:
+        assert torch.equal(getattr(first, name)[:2], getattr(second, name))
+    # Different seeds give different members
+    assert not torch.equal(first.weight_1[0], first.weight_1[1])
+
+
+def test_members_are_initialised_as_linear_layers():
+    model = EnsembleNNRatiosModel(input_shape=11, ensemble_size=2)
+
+    torch.manual_seed(NNCFG.ensemble_seed + 1)
+    layer_1 = nn.Linear(11, NNCFG.hidden_shape)
+    layer_2 = nn.Linear(NNCFG.hidden_shape, model.weight_2.shape[2])
+    assert torch.equal(model.weight_1[1], layer_1.weight.T)
+    assert torch.equal(model.bias_1[1, 0], layer_1.bias)
+    assert torch.equal(model.weight_2[1], layer_2.weight.T)
+    assert torch.equal(model.bias_2[1, 0], layer_2.bias)
+
+
+def test_global_seed_is_not_used():
+    torch.manual_seed(0)
+    expected = torch.rand(3)
+
+    torch.manual_seed(0)
+    EnsembleNNRatiosModel(input_shape=11, ensemble_size=2)
+    assert torch.equal(torch.rand(3), expected)
@@ -0,0 +1,27 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from synthetic_data import generate
+from src.sweep import expand_grid, sweep
+
+
+def test_nn_runs_do_not_depend_on_the_workers(tmp_path, monkeypatch):
+    data_dir = str(tmp_path / 'data')
+    generate(data_dir, number_tickers=40, number_dates=300)
+    # Two NN runs, with one worker the second one runs after the first one in the same process
+    runs = expand_grid(['NNRatios'], ['median', 'quartile'], ['regression'], ['monthly'],
+                       [('2015-06-01', '2016-02-01')])
+
+    histories = []
+    for workers in [1, 2]:
+        # The NN logs and checkpoints are written to the working directory
+        run_dir = tmp_path / f'workers_{workers}'
+        run_dir.mkdir()
+        monkeypatch.chdir(run_dir)
+        histories.append(sweep(runs, workers=workers, data_dir=data_dir))
+
+    assert histories[0].keys() == histories[1].keys()
+    for key in histories[0]:
+        assert histories[0][key]['history_portfolio'] == histories[1][key]['history_portfolio']
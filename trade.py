@@ -1,42 +1,69 @@
 import argparse
 
 from src.datamodule import DataModule
-from src.portfolio import Portfolio
-from src.simulator import Simulator
+from src.streaming import StreamingDataModule
+from src.portfolio import Portfolio, ArrayPortfolio
+from src.simulator import Simulator, MultiSimulator
+from src.profiler import Profiler
 
-from src.strategies.ols_ratios import OLSRatios
-from src.strategies.logit_ratios import LogitRatios
-from src.strategies.nn_ratios import NNRatios
-
-from src.strategies.cfg import OLSCFG, LogRegCFG, NNCFG
+from src.strategies.model_cache import ModelCache
+from src.strategies.registry import STRATEGIES, build_strategy, get_required_columns
 
 
 def main(strategy, frequency, decision_rule, type_model, initial_value,
          max_allocation_long, max_allocation_short, start_date,
-         end_date, save_history, risk_free_rate):
-
-    print(f'...{strategy}...')
-    dm = DataModule()
-    pf = Portfolio(initial_value=initial_value,
-                   max_allocation_long=max_allocation_long,
-                   max_allocation_short=max_allocation_short)
-
-    if strategy == 'OLSRatios':
-        OLSCFG.decision_rule = decision_rule
-        sr = OLSRatios()
-
-    elif strategy == 'LogitRatios':
-        LogRegCFG.decision_rule = decision_rule
-        sr = LogitRatios()
-
-    elif strategy == 'NNRatios':
-        NNCFG.decision_rule = decision_rule
-        NNCFG.type_model = type_model
-        sr = NNRatios()
-
-    sm = Simulator(dm, pf, sr, frequency, start_date, end_date)
-
-    sm.simulate()
+         end_date, save_history, risk_free_rate, retrain_every=None, retrain_calendar=None,
+         retrain_drift=None, array_portfolio=False, vectorized=False, streaming=False,
+         profile=False, profile_records=None, model_cache=False, num_threads=None,
+         proportional_cost=0., fixed_cost=0., slippage=0., prefetch=0):
+
+    # Several strategies are simulated side by side in one pass (see MultiSimulator)
+    strategies = [strategy] if isinstance(strategy, str) else list(strategy)
+
+    print(f'...{", ".join(strategies)}...')
+    # Only the columns used by the strategies are loaded
+    columns = get_required_columns(strategies)
+    if streaming:
+        assert not vectorized, 'Warning, vectorized simulation requires the data in memory!'
+        dm = StreamingDataModule(columns=columns)
+    else:
+        dm = DataModule(columns=columns)
+
+    runs = []
+    for name in strategies:
+        if array_portfolio:
+            pf = ArrayPortfolio(dm.all_tickers if streaming else dm.panel.tickers, initial_value=initial_value,
+                                max_allocation_long=max_allocation_long,
+                                max_allocation_short=max_allocation_short,
+                                proportional_cost=proportional_cost, fixed_cost=fixed_cost, slippage=slippage)
+        else:
+            pf = Portfolio(initial_value=initial_value,
+                           max_allocation_long=max_allocation_long,
+                           max_allocation_short=max_allocation_short,
+                           proportional_cost=proportional_cost, fixed_cost=fixed_cost, slippage=slippage)
+
+        sr = build_strategy(name, decision_rule, type_model, retrain_every=retrain_every,
+                            retrain_calendar=retrain_calendar, retrain_drift=retrain_drift)
+        if model_cache:
+            sr.model_cache = ModelCache()
+        runs.append((sr, pf))
+
+    profiler = Profiler(records_path=profile_records) if profile or profile_records else None
+    if len(runs) > 1:
+        assert not vectorized, 'Warning, vectorized simulation runs a single strategy!'
+        assert not prefetch, 'Warning, prefetching runs a single strategy!'
+        sm = MultiSimulator(dm, runs, frequency, start_date, end_date, profiler=profiler,
+                            num_threads=num_threads)
+    else:
+        sr, pf = runs[0]
+        sm = Simulator(dm, pf, sr, frequency, start_date, end_date, profiler=profiler)
+
+    if vectorized:
+        sm.simulate_vectorized()
+    elif prefetch:
+        sm.simulate(prefetch=prefetch)
+    else:
+        sm.simulate()
     sm.compute_metrics(risk_free_rate=risk_free_rate)
 
     if save_history:
@@ -47,8 +74,8 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
 
     # Add arguments
-    parser.add_argument('-s','--strategy', default='OLSRatios', choices=['OLSRatios', 'LogitRatios', 'NNRatios'],
-                        type=str, help='Choose a strategy')
+    parser.add_argument('-s','--strategy', default=['OLSRatios'], choices=STRATEGIES, nargs='+',
+                        type=str, help='Choose a strategy, several strategies are simulated side by side')
 
     parser.add_argument('-f','--frequency', default='yearly', choices=['daily', 'weekly', 'monthly', 'yearly'],
                         type=str, help='Choose frequency')
@@ -78,8 +105,52 @@ if __name__ == '__main__':
     parser.add_argument('-rf','--risk_free_rate', default=.01,
                         type=float, help='Choose risk free rate')
 
+    parser.add_argument('--retrain_every', default=None, type=int,
+                        help='Retrain the model every N steps (by default it is trained once)')
+
+    parser.add_argument('--retrain_calendar', default=None, choices=['month', 'quarter', 'year'],
+                        type=str, help='Retrain the model on the first step of each calendar period')
+
+    parser.add_argument('--retrain_drift', default=None, type=float,
+                        help='Retrain the model if the mean absolute z-score of the latest features exceeds it')
+
+    parser.add_argument('-array', '--array_portfolio', action='store_true',
+                        help='Use the vectorized portfolio with positions stored as arrays')
+
+    parser.add_argument('-vec', '--vectorized', action='store_true',
+                        help='Collect all weights first and compute the portfolio history in one pass')
+
+    parser.add_argument('-stream', '--streaming', action='store_true',
+                        help='Read the data by date from the store partitioned by year instead of loading it')
+
+    parser.add_argument('-profile', '--profile', action='store_true',
+                        help='Print the time spent in every phase of the simulation')
+
+    parser.add_argument('--profile_records', default=None, type=str,
+                        help='Write the timing of every step to the file (.jsonl or .csv)')
+
+    parser.add_argument('-cache', '--model_cache', action='store_true',
+                        help='Reuse the models fitted on the same data by the previous runs')
+
+    parser.add_argument('--cost', default=0., type=float,
+                        help='Proportional transaction cost as a share of the traded value')
+
+    parser.add_argument('--fixed_cost', default=0., type=float, help='Fixed cost of every traded ticker')
+
+    parser.add_argument('--slippage', default=0., type=float, help='Slippage as a share of the traded value')
+
+    parser.add_argument('-prefetch', '--prefetch', default=0, type=int,
+                        help='Prepare the data of up to N next steps in a background thread')
+
+    parser.add_argument('--threads', default=None, type=int,
+                        help='Create the portfolios of several strategies in a pool of threads')
+
     args = parser.parse_args()
 
     main(args.strategy, args.frequency, args.decision_rule, args.type_model,
          args.initial_value, args.max_allocation_long, args.max_allocation_short,
-         args.start_date, args.end_date, args.save_history, args.risk_free_rate)
+         args.start_date, args.end_date, args.save_history, args.risk_free_rate,
+         args.retrain_every, args.retrain_calendar, args.retrain_drift, args.array_portfolio,
+         args.vectorized, args.streaming, args.profile, args.profile_records,
+         args.model_cache, args.threads, args.cost, args.fixed_cost, args.slippage,
+         args.prefetch)